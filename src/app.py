@@ -1,7 +1,15 @@
 import streamlit as st
+import asyncio
+import concurrent.futures
+import functools
+import io
 import os
+import queue
+import re
 import sys
+import threading
 from pathlib import Path
+from typing import Optional
 from dotenv import load_dotenv
 from langchain_core.messages import HumanMessage, AIMessage
 
@@ -10,11 +18,16 @@ project_root = Path(__file__).parent.parent
 if str(project_root) not in sys.path:
     sys.path.insert(0, str(project_root))
 
-from src.models import create_model, get_available_models
+from src.models import create_model, get_available_models, upload_image_file
 from src.models.config import ModelConfig
 from src.utils import setup_logging, get_app_config, get_logging_config, get_chat_config, get_file_upload_config, get_history_config
-from src.utils.file_processing import process_image, process_pdf, get_file_type, format_file_content_for_ai, encode_image_to_base64, get_image_mime_type, sanitize_user_input
+from src.utils.file_processing import process_image, process_pdf, get_file_type, format_file_content_for_ai, encode_image_for_upload, encode_bytes_to_base64, get_image_mime_type, sanitize_user_input
 from src.utils.history_manager import ChatHistoryManager
+from src.utils.langchain_messages import (
+    apply_history_window,
+    reset_langchain_messages,
+    sync_langchain_messages,
+)
 
 # 環境変数の読み込み
 load_dotenv()
@@ -26,11 +39,13 @@ chat_config = get_chat_config()
 file_upload_config = get_file_upload_config()
 history_config = get_history_config()
 
-# ログ設定
-logger = setup_logging(
-    level=logging_config.get("level", "INFO"), 
-    logger_name="chatbot"
-)
+# ログ設定（プロセスごとに一度だけ実行）
+@st.cache_resource(show_spinner=False)
+def init_logging(level: str):
+    """ロガーを初期化して返す"""
+    return setup_logging(level=level, logger_name="chatbot")
+
+logger = init_logging(logging_config.get("level", "INFO"))
 
 # 履歴管理の初期化
 db_path = history_config.get("database", {}).get("path", "chat_history.db")
@@ -40,6 +55,312 @@ def show_api_key_error():
     """APIキー未設定時の共通エラーメッセージ"""
     st.error("利用可能なモデルがありません。APIキーを設定してください。")
 
+# APIエラーの種類ごとのアドバイス（上から順に判定し、最初に一致したものを表示）
+ERROR_PATTERNS = [
+    (re.compile(r"401|Unauthorized"), "🔑 APIキーが無効です。正しいAPIキーを設定してください。"),
+    (re.compile(r"403|Forbidden"), "🚫 APIキーの権限が不足しています。APIキーの設定を確認してください。"),
+    (re.compile(r"429|rate_limit", re.IGNORECASE), "⏱️ レート制限に達しました。しばらく待ってから再試行してください。"),
+    (re.compile(r"529|overloaded", re.IGNORECASE), "⚡ サーバーが過負荷状態です。しばらく待ってから再試行してください。"),
+    (re.compile(r"50[023]"), "🔧 サーバーで一時的な問題が発生しています。しばらく待ってから再試行してください。"),
+]
+DEFAULT_ERROR_ADVICE = "💡 問題が解決しない場合は、APIキーの設定やネットワーク接続を確認してください。"
+
+def get_error_advice(error_message: str) -> str:
+    """エラーメッセージに応じたアドバイスを取得"""
+    for pattern, advice in ERROR_PATTERNS:
+        if pattern.search(error_message):
+            return advice
+    return DEFAULT_ERROR_ADVICE
+
+@st.cache_resource(max_entries=8, show_spinner=False)
+def get_cached_model(model_name: str):
+    """モデルインスタンスをキャッシュして取得（HTTPクライアントや接続プールを再利用）"""
+    return create_model(model_name)
+
+def on_model_change():
+    """モデル選択の変更を反映し、再読み込み後も維持されるようURLのクエリパラメータに保存"""
+    st.session_state.selected_model = st.session_state.model_selectbox
+    st.query_params["model"] = st.session_state.selected_model
+
+def reload_api_keys():
+    """.envを再読み込みし、APIキーに依存するキャッシュを破棄（APIキーの変更を反映）"""
+    load_dotenv(override=True)
+    get_available_models.cache_clear()
+    get_cached_model.clear()
+    # セッション状態のモデル一覧と選択は次の実行時に再初期化する
+    st.session_state.pop("model_names", None)
+    st.session_state.pop("selected_model", None)
+
+@st.cache_resource(show_spinner=False)
+def get_history_version_state() -> dict:
+    """
+    会話一覧のキャッシュ無効化用のカウンターを取得（履歴を変更するたびに増やす）
+    
+    cache_dataのキャッシュは全セッションで共有されるため、カウンターもセッションごとではなく
+    プロセスで1つにし、どのセッションでの変更も全セッションの会話一覧に反映する
+    """
+    return {"value": 0, "lock": threading.Lock()}
+
+def get_history_version() -> int:
+    """現在の履歴の変更カウンターを取得"""
+    return get_history_version_state()["value"]
+
+@st.cache_data(ttl=5, show_spinner=False)
+def load_conversation_list(limit: int, version: int, cursor: Optional[tuple] = None):
+    """
+    会話一覧を1ページ分キャッシュして取得（再実行ごとのSQLiteクエリを回避）
+    
+    Args:
+        limit: 取得件数
+        version: 履歴の変更カウンター（変更後は新しいキーになりキャッシュを使わない）
+        cursor: 前のページ最後の会話の (updated_at, session_id)
+    """
+    return history_manager.get_conversation_list(limit=limit, cursor=cursor)
+
+def load_conversation_pages(page_size: int, pages: int):
+    """
+    会話一覧を先頭から指定ページ数分取得
+    
+    Args:
+        page_size: 1ページの件数
+        pages: 取得するページ数
+        
+    Returns:
+        tuple: (会話一覧, 続きのページがあるか)
+    """
+    conversations = []
+    cursor = None
+    for _ in range(pages):
+        page = load_conversation_list(page_size, get_history_version(), cursor)
+        conversations.extend(page)
+        if len(page) < page_size:
+            return conversations, False
+        # 各ページは前ページ最後の行を起点に取得するため、OFFSETのように読み飛ばす行が増えない
+        cursor = (page[-1]["updated_at"], page[-1]["session_id"])
+    return conversations, True
+
+@st.cache_resource(show_spinner=False)
+def get_history_writer() -> concurrent.futures.ThreadPoolExecutor:
+    """履歴の書き込み用ワーカーを取得（書き込み順序を保つため1スレッド）"""
+    return concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="history-writer")
+
+def _log_history_write_error(future: concurrent.futures.Future):
+    """バックグラウンドでの履歴書き込みの失敗をログに記録"""
+    if error := future.exception():
+        logger.error(f"履歴の保存に失敗: {error}")
+
+def submit_history_write(func, *args, **kwargs):
+    """
+    履歴の書き込みをバックグラウンドで実行し、応答生成を待たせない
+    
+    Args:
+        func: 実行する書き込み処理
+        *args, **kwargs: 書き込み処理に渡す引数
+    """
+    future = get_history_writer().submit(func, *args, **kwargs)
+    future.add_done_callback(_log_history_write_error)
+    # 書き込み完了時にも更新し、完了前に他のセッションが読み込んだ一覧をキャッシュに残さない
+    # （コールバックはワーカースレッドで実行されるため、カウンターはここで取得して渡す）
+    version_state = get_history_version_state()
+    future.add_done_callback(lambda _: _increment_history_version(version_state))
+    st.session_state.pending_history_writes.append(future)
+    bump_history_version()
+
+def wait_for_history_writes():
+    """未完了の履歴書き込みを待つ（履歴を読み込む前に呼び、書き込み前の内容を表示しないようにする）"""
+    if st.session_state.pending_history_writes:
+        concurrent.futures.wait(st.session_state.pending_history_writes)
+        st.session_state.pending_history_writes = []
+
+def _increment_history_version(version_state: dict):
+    """履歴の変更カウンターを増やす"""
+    with version_state["lock"]:
+        version_state["value"] += 1
+
+def bump_history_version():
+    """履歴の変更を全セッションの会話一覧のキャッシュに反映させる"""
+    _increment_history_version(get_history_version_state())
+
+def on_conversation_select(table_key: str, session_ids: list):
+    """会話一覧で選択が変わったときに、選択された会話を読み込む"""
+    rows = st.session_state[table_key].selection.rows
+    if not rows:
+        return
+    session_id = session_ids[rows[0]]
+    if session_id == st.session_state.current_session_id:
+        return
+
+    messages = history_manager.load_session_messages(session_id)
+    if messages:
+        st.session_state.messages = messages
+        reset_langchain_messages(st.session_state)
+        st.session_state.current_session_id = session_id
+        history_manager.set_current_session(session_id)
+        st.toast(f"会話を読み込みました ({len(messages)}メッセージ)")
+
+def _as_named_buffer(file_bytes: bytes, file_name: str) -> io.BytesIO:
+    """アップロードファイルの内容を名前付きのインメモリバッファに変換"""
+    buffer = io.BytesIO(file_bytes)
+    buffer.name = file_name
+    return buffer
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def extract_pdf_text(file_bytes: bytes, file_name: str) -> Optional[str]:
+    """PDFのテキスト抽出結果をファイル内容をキーにキャッシュ（プレビューと送信で再解析しない）"""
+    return process_pdf(_as_named_buffer(file_bytes, file_name))
+
+def get_pdf_text(uploaded_file, file_bytes: bytes) -> Optional[str]:
+    """
+    アップロード中のPDFのテキストを取得
+    
+    抽出結果はアップロードのfile_idをキーにセッション状態へ保持し、
+    再実行のたびにファイル全体をハッシュしてキャッシュを引き直さない
+    """
+    pdf_texts = st.session_state.setdefault("current_pdf_texts", {})
+    if uploaded_file.file_id not in pdf_texts:
+        pdf_texts[uploaded_file.file_id] = extract_pdf_text(file_bytes, uploaded_file.name)
+    return pdf_texts[uploaded_file.file_id]
+
+# PIL Imageはpickle時にformat情報が失われるため、コピーを返すcache_dataではなくcache_resourceを使う
+@st.cache_resource(max_entries=32, show_spinner=False)
+def load_image(file_bytes: bytes, file_name: str):
+    """画像の読み込み結果をファイル内容をキーにキャッシュ（プレビューと送信で再デコードしない）"""
+    max_dimension = file_upload_config.get("image_processing", {}).get("max_dimension")
+    result = process_image(_as_named_buffer(file_bytes, file_name), max_dimension)
+    if result is not None:
+        # 同じオブジェクトを全セッションで共有するため、遅延デコード（load()でのオブジェクト変更）が
+        # 複数スレッドから同時に走らないよう、キャッシュする前にデコードを済ませておく
+        result[0].load()
+    return result
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def encode_image_bytes(file_bytes: bytes) -> str:
+    """画像バイト列のbase64エンコード結果をキャッシュ"""
+    return encode_bytes_to_base64(file_bytes)
+
+def get_image_payload(msg):
+    """
+    メッセージの画像を送信用のバイト列とMIMEタイプで取得
+    
+    アップロード時の元バイト列があればPILで再エンコードせずに使い、
+    ない画像（縮小したもの・履歴から復元したもの等）は送信用に再エンコードする
+    """
+    image = msg["image"]
+    if "image_bytes" in msg and image.format:
+        return msg["image_bytes"], get_image_mime_type(image.format)
+    quality = file_upload_config.get("image_processing", {}).get("quality", 85)
+    return encode_image_for_upload(image, quality)
+
+def get_image_file_id(msg, model_name: str) -> Optional[str]:
+    """
+    メッセージの画像をFiles APIにアップロード済みのファイルIDを取得
+    
+    ファイルIDはプロバイダーごとにメッセージ辞書の"_file_ids"にキャッシュし、
+    アップロードは最初の1回だけ行う（失敗時もNoneを記録し、base64送信にフォールバックする）
+    """
+    provider = ModelConfig.MODELS[model_name]["provider"]
+    file_ids = msg.setdefault("_file_ids", {})
+    if provider not in file_ids:
+        data, mime_type = get_image_payload(msg)
+        file_ids[provider] = upload_image_file(
+            model_name,
+            data,
+            f"image.{mime_type.split('/')[-1]}",
+            mime_type
+        )
+    return file_ids[provider]
+
+def to_langchain_message(msg, supports_vision: bool, file_api_model: Optional[str] = None):
+    """
+    セッションのメッセージ1件をLangChainメッセージに変換
+    
+    画像のbase64エンコード結果はメッセージ辞書の"_b64"にキャッシュし、
+    以降のターンでは再エンコードしない。file_api_modelが指定された場合は
+    Files APIのファイルIDで画像を参照し、画像データ自体は送信しない
+    """
+    if msg["role"] == "assistant":
+        return AIMessage(content=msg["content"])
+    
+    # 画像がある場合の処理
+    if "image" in msg and supports_vision:
+        try:
+            if file_api_model and (file_id := get_image_file_id(msg, file_api_model)):
+                content = [
+                    {"type": "text", "text": msg["content"]},
+                    {"type": "image", "file_id": file_id}
+                ]
+                return HumanMessage(content=content)
+            
+            if "_b64" not in msg:
+                # 画像をbase64エンコード
+                data, mime_type = get_image_payload(msg)
+                msg["_b64"] = (encode_image_bytes(data), mime_type)
+            base64_image, mime_type = msg["_b64"]
+            
+            # マルチモーダルメッセージを作成（LangChain辞書形式）
+            content = [
+                {"type": "text", "text": msg["content"]},
+                {
+                    "type": "image_url",
+                    "image_url": {
+                        "url": f"data:{mime_type};base64,{base64_image}"
+                    }
+                }
+            ]
+            return HumanMessage(content=content)
+        except Exception as e:
+            logger.error(f"画像処理エラー: {e}")
+            # エラー時はテキストのみ
+    
+    # テキストのみ、または画像非対応モデル
+    return HumanMessage(content=msg["content"])
+
+@st.cache_resource(show_spinner=False)
+def get_event_loop() -> asyncio.AbstractEventLoop:
+    """全セッションで共有するイベントループをバックグラウンドスレッドで起動して取得"""
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, name="chat-event-loop", daemon=True).start()
+    return loop
+
+_STREAM_END = object()
+
+def stream_response_text(model, langchain_messages):
+    """
+    共有イベントループ上でmodel.astreamを実行し、応答テキストを逐次返す
+    
+    ネットワーク待ちの間はスレッドを占有しないため、複数セッションの同時リクエストが
+    互いに直列化されない。イベントループを使い回すのは、プロバイダーの非同期HTTPクライアントが
+    プロセス内で共有されており、asyncio.runのように毎回ループを閉じると接続プールが壊れるため。
+    
+    Args:
+        model: LangChainのチャットモデル
+        langchain_messages: モデルに送信するメッセージのリスト
+        
+    Yields:
+        str: 応答テキストの断片
+    """
+    chunks = queue.Queue()
+    
+    async def produce():
+        try:
+            async for chunk in model.astream(langchain_messages):
+                # chunk.textはプロバイダー固有のコンテンツブロック形式も文字列に正規化する
+                chunks.put(chunk.text)
+        except Exception as e:
+            chunks.put(e)
+        finally:
+            chunks.put(_STREAM_END)
+    
+    future = asyncio.run_coroutine_threadsafe(produce(), get_event_loop())
+    try:
+        while (item := chunks.get()) is not _STREAM_END:
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        # 表示側で中断された場合はリクエストも取り消す
+        future.cancel()
+
 # ページ設定
 st.set_page_config(
     page_title=app_config.get("title", "AIチャットボット"),
@@ -54,6 +375,9 @@ st.title(f"{app_config.get('page_icon', '🤖')} {app_config.get('title', 'AIチ
 if "messages" not in st.session_state:
     st.session_state.messages = []
 
+if "langchain_messages" not in st.session_state:
+    reset_langchain_messages(st.session_state)
+
 # 履歴管理のセッション状態初期化
 if "current_session_id" not in st.session_state:
     st.session_state.current_session_id = None
@@ -61,16 +385,33 @@ if "current_session_id" not in st.session_state:
 if "history_initialized" not in st.session_state:
     st.session_state.history_initialized = False
 
-if "available_models" not in st.session_state:
-    st.session_state.available_models = get_available_models()
+# バックグラウンドで実行中の履歴書き込み
+if "pending_history_writes" not in st.session_state:
+    st.session_state.pending_history_writes = []
+
+# サイドバーに表示する会話一覧のページ数
+if "history_pages" not in st.session_state:
+    st.session_state.history_pages = 1
+
+# 利用可能なモデル一覧（プロセス内でキャッシュ済みのため毎回の取得は軽量）
+available_models = get_available_models()
+
+if "model_names" not in st.session_state:
+    # モデル名の並びと位置をセッション開始時に一度だけ計算しておく
+    st.session_state.model_names = tuple(available_models)
+    st.session_state.model_index = {name: i for i, name in enumerate(st.session_state.model_names)}
 
 if "selected_model" not in st.session_state:
-    if st.session_state.available_models:
+    if available_models:
         default_model = chat_config.get("default_model", "GPT-4o")
-        if default_model in st.session_state.available_models:
+        # URLのクエリパラメータに前回選択したモデルがあれば優先する
+        query_model = st.query_params.get("model")
+        if query_model in available_models:
+            st.session_state.selected_model = query_model
+        elif default_model in available_models:
             st.session_state.selected_model = default_model
         else:
-            st.session_state.selected_model = list(st.session_state.available_models.keys())[0]
+            st.session_state.selected_model = next(iter(available_models))
     else:
         st.session_state.selected_model = None
 
@@ -82,25 +423,42 @@ if "file_uploader_key" not in st.session_state:
 with st.sidebar:
     # ファイルアップロード機能
     st.header("📁 ファイルアップロード")
-    uploaded_file = st.file_uploader(
+    uploaded_files = st.file_uploader(
         "画像またはPDFファイルをアップロード",
         type=['png', 'jpg', 'jpeg', 'gif', 'bmp', 'webp', 'pdf'],
-        help="対応形式: PNG, JPG, JPEG, GIF, BMP, WebP, PDF\nファイルサイズ制限: 画像 10MB、PDF 50MB",
+        help="対応形式: PNG, JPG, JPEG, GIF, BMP, WebP, PDF\nファイルサイズ制限: 画像 10MB、PDF 50MB\n複数ファイルを選択した場合は、ファイルごとに同じ質問をまとめて送信します",
+        accept_multiple_files=True,
         key=f"file_uploader_{st.session_state.file_uploader_key}"
     )
     
-    if uploaded_file is not None:
-        file_type = get_file_type(uploaded_file.name, uploaded_file)
+    # ファイル内容は一度だけ読み込み、プレビューと送信の両方で使い回す
+    uploads = [(uploaded_file, uploaded_file.getvalue()) for uploaded_file in uploaded_files]
+    
+    # ファイル種類の判定（内容検証を含む）はアップロードごとに一度だけ行う
+    known_file_types = st.session_state.get("current_file_types", {})
+    st.session_state.current_file_types = {
+        uploaded_file.file_id: known_file_types.get(uploaded_file.file_id) or get_file_type(uploaded_file.name, uploaded_file)
+        for uploaded_file, _ in uploads
+    }
+    # 外されたファイルのPDF抽出結果は破棄する
+    st.session_state.current_pdf_texts = {
+        file_id: pdf_text
+        for file_id, pdf_text in st.session_state.get("current_pdf_texts", {}).items()
+        if file_id in st.session_state.current_file_types
+    }
+    
+    for uploaded_file, file_bytes in uploads:
+        file_type = st.session_state.current_file_types[uploaded_file.file_id]
         
         if file_type == 'unknown':
-            st.error("🚫 不正なファイル形式です。安全でないファイルまたはサポートされていないファイル形式です。")
+            st.error(f"🚫 不正なファイル形式です: {uploaded_file.name}。安全でないファイルまたはサポートされていないファイル形式です。")
         else:
             st.success(f"ファイルがアップロードされました: {uploaded_file.name}")
         
         if file_type == 'image':
             # 画像プレビュー表示
             try:
-                image, description = process_image(uploaded_file)
+                image, description = load_image(file_bytes, uploaded_file.name)
                 if image:
                     st.image(image, caption=uploaded_file.name, use_container_width=True)
                     with st.expander("画像情報"):
@@ -111,16 +469,14 @@ with st.sidebar:
         elif file_type == 'pdf':
             # PDFファイル情報表示
             st.info("📄 PDFファイルが選択されています")
-            with st.expander("PDFプレビュー"):
+            with st.expander(f"PDFプレビュー: {uploaded_file.name}"):
                 try:
-                    # ファイルポインタを先頭に戻す
-                    uploaded_file.seek(0)
-                    pdf_text = process_pdf(uploaded_file)
+                    pdf_text = get_pdf_text(uploaded_file, file_bytes)
                     if pdf_text:
                         # 設定ファイルからプレビュー文字数を取得
                         preview_length = file_upload_config.get("pdf_processing", {}).get("preview_length", 500)
                         preview_text = pdf_text[:preview_length] + "..." if len(pdf_text) > preview_length else pdf_text
-                        st.text_area("内容プレビュー", preview_text, height=200, disabled=True)
+                        st.text_area("内容プレビュー", preview_text, height=200, disabled=True, key=f"pdf_preview_{uploaded_file.file_id}")
                     else:
                         st.warning("PDFからテキストを抽出できませんでした")
                 except Exception as e:
@@ -133,22 +489,18 @@ with st.sidebar:
     st.header("⚙️ 設定")
     
     # モデル選択
-    available_models = st.session_state.available_models
     if available_models:
         st.subheader("🤖 AIモデル選択")
         
-        model_names = list(available_models.keys())
+        # 変更はコールバックで反映するため、選択のたびにページ全体を再実行しない
         selected_model = st.selectbox(
             "使用するモデルを選択:",
-            model_names,
-            index=model_names.index(st.session_state.selected_model) if st.session_state.selected_model in model_names else 0
+            st.session_state.model_names,
+            index=st.session_state.model_index.get(st.session_state.selected_model, 0),
+            key="model_selectbox",
+            on_change=on_model_change
         )
         
-        # モデルが変更された場合
-        if selected_model != st.session_state.selected_model:
-            st.session_state.selected_model = selected_model
-            st.rerun()
-        
         # 選択されたモデルの説明を表示
         if selected_model in available_models:
             model_info = available_models[selected_model]
@@ -162,13 +514,20 @@ with st.sidebar:
     else:
         show_api_key_error()
     
+    # APIキーの変更を反映（キャッシュ済みのモデルを破棄）
+    if st.button("🔑 APIキーを再読み込み", use_container_width=True, help=".envファイルの変更を反映します"):
+        reload_api_keys()
+        st.rerun()
+    
     # 新しい会話を開始
     if st.button("🆕 新しい会話", use_container_width=True):
         # 現在のメッセージをクリア
         st.session_state.messages = []
+        reset_langchain_messages(st.session_state)
         # 新しいセッションを開始
         new_session_id = history_manager.start_new_session()
         st.session_state.current_session_id = new_session_id
+        bump_history_version()
         st.success("新しい会話を開始しました")
         st.rerun()
     
@@ -177,218 +536,244 @@ with st.sidebar:
     st.subheader("📚 会話履歴")
     
     # 会話一覧を取得
-    conversations = history_manager.get_conversation_list(limit=10)
+    wait_for_history_writes()
+    conversations, has_more = load_conversation_pages(10, st.session_state.history_pages)
     
     if conversations:
-        for conv in conversations:
-            session_id = conv["session_id"]
-            title = conv["title"] or "無題の会話"
-            updated_at = conv["updated_at"]
-            message_count = conv["message_count"]
-            
-            # 日時をフォーマット
-            try:
-                from datetime import datetime
-                dt = datetime.fromisoformat(updated_at.replace('Z', '+00:00'))
-                formatted_time = dt.strftime("%m/%d %H:%M")
-            except:
-                formatted_time = "不明"
-            
-            # タイトルを短縮
-            display_title = title[:25] + "..." if len(title) > 25 else title
-            
-            # 会話選択と削除ボタンを並べたレイアウト
-            col1, col2 = st.columns([4, 1])
-            
-            with col1:
-                if st.button(
-                    f"💬 {display_title}",
-                    key=f"load_conv_{session_id}",
-                    help=f"メッセージ数: {message_count}\\n更新: {formatted_time}",
-                    use_container_width=True
-                ):
-                    # 会話を読み込む
-                    messages = history_manager.load_session_messages(session_id)
-                    if messages:
-                        st.session_state.messages = messages
-                        st.session_state.current_session_id = session_id
-                        history_manager.set_current_session(session_id)
-                        st.success(f"会話を読み込みました ({len(messages)}メッセージ)")
-                        st.rerun()
-            
-            with col2:
-                if st.button("🗑️", key=f"delete_conv_{session_id}", help="この会話を削除"):
-                    # 会話を削除
-                    if history_manager.delete_conversation(session_id):
-                        # 現在表示中の会話が削除された場合はクリア
-                        if st.session_state.current_session_id == session_id:
-                            st.session_state.messages = []
-                            st.session_state.current_session_id = None
-                        st.success("会話を削除しました")
-                        st.rerun()
-                    else:
-                        st.error("会話の削除に失敗しました")
-            
-            # 日時とメッセージ数を小さく表示
-            st.caption(f"🕒 {formatted_time} • 💬 {message_count}件")
+        session_ids = [conv["session_id"] for conv in conversations]
+        table_data = {
+            "タイトル": [conv["title"] or "無題の会話" for conv in conversations],
+            # 日時はSQLite側で表示形式に整形済み
+            "更新": [conv["updated_display"] or "不明" for conv in conversations],
+            "件数": [conv["message_count"] for conv in conversations],
+        }
+        
+        # 一覧は1つの表として描画し、行の選択で会話を読み込む
+        # （履歴が変わるたびにキーを変えて、前の選択状態を持ち越さない）
+        table_key = f"conversation_table_{get_history_version()}"
+        event = st.dataframe(
+            table_data,
+            key=table_key,
+            on_select=functools.partial(on_conversation_select, table_key, session_ids),
+            selection_mode="single-row",
+            hide_index=True,
+            use_container_width=True
+        )
+        
+        # 選択中の会話の削除
+        selected_rows = event.selection.rows
+        if selected_rows and st.button("🗑️ 選択した会話を削除", use_container_width=True):
+            session_id = session_ids[selected_rows[0]]
+            if history_manager.delete_conversation(session_id):
+                bump_history_version()
+                # 現在表示中の会話が削除された場合はクリア
+                if st.session_state.current_session_id == session_id:
+                    st.session_state.messages = []
+                    reset_langchain_messages(st.session_state)
+                    st.session_state.current_session_id = None
+                st.toast("会話を削除しました")
+                st.rerun()
+            else:
+                st.error("会話の削除に失敗しました")
+        
+        # 続きの会話を読み込む
+        if has_more and st.button("もっと見る", use_container_width=True):
+            st.session_state.history_pages += 1
+            st.rerun()
     else:
         st.info("💬 まだ保存された会話がありません")
 
-# チャット履歴の表示
-for message in st.session_state.messages:
+def render_message(message):
+    """
+    チャットメッセージを1件表示
+    
+    サニタイズ済みの本文はメッセージ辞書の"_display"にキャッシュし、再実行時の再処理を避ける
+    """
+    if "_display" not in message:
+        message["_display"] = sanitize_user_input(message["content"])
     with st.chat_message(message["role"]):
-        st.markdown(sanitize_user_input(message["content"]))
+        st.markdown(message["_display"])
         # 画像がある場合は表示
         if "image" in message:
             st.image(message["image"], caption="アップロードされた画像", width=300)
 
-# ユーザー入力
-if prompt := st.chat_input("メッセージを入力してください..."):
-    # ファイルがアップロードされている場合の処理
-    user_message_content = prompt
-    user_message_data = {"role": "user", "content": user_message_content}
+def build_assistant_message(ai_response: str) -> dict:
+    """AIの応答からアシスタントメッセージを作成（表示用のサニタイズ済み本文も保持）"""
+    return {"role": "assistant", "content": ai_response, "_display": sanitize_user_input(ai_response)}
+
+def build_user_message(prompt: str, uploaded_file, file_bytes: bytes, file_type: Optional[str]) -> dict:
+    """
+    プロンプトとアップロードファイルからユーザーメッセージを作成
     
-    if uploaded_file is not None:
-        file_type = get_file_type(uploaded_file.name)
+    Args:
+        prompt: ユーザーの入力テキスト
+        uploaded_file: Streamlitのアップロードファイルオブジェクト
+        file_bytes: アップロードファイルの内容
+        file_type: ファイル種類 ('image', 'pdf', 'unknown')
         
-        if file_type == 'image':
-            # 画像処理
-            uploaded_file.seek(0)
-            image_result = process_image(uploaded_file)
-            if image_result:
-                image, description = image_result
-                user_message_content = f"{prompt}\n\n{description}"
-                user_message_data["image"] = image
-                user_message_data["content"] = user_message_content
+    Returns:
+        dict: チャット履歴に追加するユーザーメッセージ
+    """
+    user_message_data = {"role": "user", "content": prompt}
+    
+    if file_type == 'image':
+        # 画像処理
+        image_result = load_image(file_bytes, uploaded_file.name)
+        if image_result:
+            image, description = image_result
+            user_message_data["image"] = image
+            user_message_data["image_bytes"] = file_bytes
+            user_message_data["content"] = f"{prompt}\n\n{description}"
+    
+    elif file_type == 'pdf':
+        # PDF処理
+        pdf_text = get_pdf_text(uploaded_file, file_bytes)
+        if pdf_text:
+            file_content = format_file_content_for_ai(file_type, pdf_text, uploaded_file.name)
+            user_message_data["content"] = f"{prompt}\n\n{file_content}"
+    
+    return user_message_data
+
+def save_user_message_data(user_message_data: dict) -> bool:
+    """
+    ユーザーメッセージをデータベースに保存（自動保存が有効な場合）
+    
+    Args:
+        user_message_data: 保存するユーザーメッセージ
         
-        elif file_type == 'pdf':
-            # PDF処理
-            uploaded_file.seek(0)
-            pdf_text = process_pdf(uploaded_file)
-            if pdf_text:
-                file_content = format_file_content_for_ai(file_type, pdf_text, uploaded_file.name)
-                user_message_content = f"{prompt}\n\n{file_content}"
-                user_message_data["content"] = user_message_content
-    
-    # ユーザーメッセージを履歴に追加
-    st.session_state.messages.append(user_message_data)
-    
-    # データベースに保存（自動保存が有効な場合）
-    if history_config.get("management", {}).get("auto_save", True):
-        try:
-            # セッションIDを確保
-            if not st.session_state.current_session_id:
-                new_session_id = history_manager.start_new_session(st.session_state.selected_model)
-                st.session_state.current_session_id = new_session_id
-            else:
-                # 既存のセッションIDをhistory_managerに設定
-                history_manager.set_current_session(st.session_state.current_session_id)
-            
-            image_data = user_message_data.get("image")
-            history_manager.save_user_message(
-                content=user_message_content,
-                image=image_data,
-                model_name=st.session_state.selected_model
-            )
-        except Exception as e:
-            logger.error(f"ユーザーメッセージの保存に失敗: {e}")
+    Returns:
+        bool: 新しい会話を開始した場合True
+    """
+    if not history_config.get("management", {}).get("auto_save", True):
+        return False
     
-    # ファイルがアップロードされていた場合はリセット
-    if uploaded_file is not None:
-        # ファイルアップロードをリセットするため、キーを変更してfile_uploaderを再生成
-        st.session_state.file_uploader_key += 1
-        st.rerun()
+    started_new_conversation = False
+    # セッションIDを確保
+    if not st.session_state.current_session_id:
+        new_session_id = history_manager.start_new_session(st.session_state.selected_model)
+        st.session_state.current_session_id = new_session_id
+        started_new_conversation = True
+    else:
+        # 既存のセッションIDをhistory_managerに設定
+        history_manager.set_current_session(st.session_state.current_session_id)
     
-    # ユーザーメッセージを表示
-    with st.chat_message("user"):
-        st.markdown(sanitize_user_input(user_message_content))
-        if "image" in user_message_data:
-            st.image(user_message_data["image"], caption="アップロードされた画像", width=300)
+    submit_history_write(
+        history_manager.save_user_message,
+        content=user_message_data["content"],
+        image=user_message_data.get("image"),
+        model_name=st.session_state.selected_model,
+        session_id=st.session_state.current_session_id,
+        image_bytes=user_message_data.get("image_bytes")
+    )
+    return started_new_conversation
+
+def save_ai_response(ai_response: str):
+    """AIの応答をデータベースに保存（自動保存が有効な場合）"""
+    if not history_config.get("management", {}).get("auto_save", True):
+        return
     
-    # AIの応答を生成
-    with st.spinner("考え中..."):
-        try:
-            # 選択されたモデルを取得
-            if not st.session_state.selected_model:
-                show_api_key_error()
-            elif not (model := create_model(st.session_state.selected_model)):
-                st.error(f"モデル '{st.session_state.selected_model}' の初期化に失敗しました。")
-            else:
-                # LangChainメッセージ形式に変換
-                langchain_messages = []
-                model_config = ModelConfig.MODELS.get(st.session_state.selected_model, {})
-                supports_vision = model_config.get("supports_vision", False)
-                
-                for msg in st.session_state.messages:
-                    if msg["role"] == "user":
-                        # 画像がある場合の処理
-                        if "image" in msg and supports_vision:
-                            try:
-                                # 画像をbase64エンコード
-                                image = msg["image"]
-                                image_format = image.format or "PNG"
-                                base64_image = encode_image_to_base64(image, image_format)
-                                mime_type = get_image_mime_type(image_format)
-                                
-                                # マルチモーダルメッセージを作成（LangChain辞書形式）
-                                content = [
-                                    {"type": "text", "text": msg["content"]},
-                                    {
-                                        "type": "image_url",
-                                        "image_url": {
-                                            "url": f"data:{mime_type};base64,{base64_image}"
-                                        }
-                                    }
-                                ]
-                                langchain_messages.append(HumanMessage(content=content))
-                            except Exception as e:
-                                logger.error(f"画像処理エラー: {e}")
-                                # エラー時はテキストのみ
-                                langchain_messages.append(HumanMessage(content=msg["content"]))
-                        else:
-                            # テキストのみ、または画像非対応モデル
-                            langchain_messages.append(HumanMessage(content=msg["content"]))
-                    elif msg["role"] == "assistant":
-                        langchain_messages.append(AIMessage(content=msg["content"]))
-                
-                # システムメッセージを追加
-                system_message = HumanMessage(content="あなたは親切で有用なAIアシスタントです。日本語で丁寧に回答してください。")
-                langchain_messages.insert(0, system_message)
-                
-                # AIから応答を取得
-                response = model.invoke(langchain_messages)
-                ai_response = response.content
-                
-                # AIの応答を履歴に追加
-                st.session_state.messages.append({"role": "assistant", "content": ai_response})
-                
-                # データベースに保存（自動保存が有効な場合）
-                if history_config.get("management", {}).get("auto_save", True):
-                    try:
-                        # セッションIDが設定されていることを確認
-                        if st.session_state.current_session_id:
-                            history_manager.set_current_session(st.session_state.current_session_id)
-                        history_manager.save_assistant_message(ai_response)
-                    except Exception as e:
-                        logger.error(f"AIメッセージの保存に失敗: {e}")
-                
-                # ページを再読み込みして新しいメッセージを表示
-                st.rerun()
+    # セッションIDが設定されていることを確認
+    if st.session_state.current_session_id:
+        history_manager.set_current_session(st.session_state.current_session_id)
+    submit_history_write(
+        history_manager.save_assistant_message,
+        ai_response,
+        session_id=history_manager.get_current_session_id()
+    )
+
+# チャット領域はフラグメントとして分離し、送信時にサイドバーを含むページ全体を再実行しない
+@st.fragment
+def render_chat():
+    """チャット履歴の表示とユーザー入力・AI応答の処理"""
+    # チャット履歴の表示
+    for message in st.session_state.messages:
+        render_message(message)
+
+    # ユーザー入力
+    if prompt := st.chat_input("メッセージを入力してください..."):
+        # アップロードされたファイルごとにユーザーメッセージを作成（ファイルがなければプロンプトのみ）
+        user_messages = [
+            build_user_message(prompt, uploaded_file, file_bytes, st.session_state.current_file_types.get(uploaded_file.file_id))
+            for uploaded_file, file_bytes in uploads
+        ] or [{"role": "user", "content": prompt}]
+        started_new_conversation = False
+        
+        if len(user_messages) == 1:
+            # ユーザーメッセージを履歴に追加して保存
+            user_message_data = user_messages[0]
+            st.session_state.messages.append(user_message_data)
+            started_new_conversation = save_user_message_data(user_message_data)
+            render_message(user_message_data)
+        
+        # AIの応答を生成
+        with st.spinner("考え中..."):
+            try:
+                # 選択されたモデルを取得
+                if not st.session_state.selected_model:
+                    show_api_key_error()
+                elif not (model := get_cached_model(st.session_state.selected_model)):
+                    st.error(f"モデル '{st.session_state.selected_model}' の初期化に失敗しました。")
+                else:
+                    # LangChainメッセージ形式に変換（前回からの差分のみ）
+                    model_config = ModelConfig.MODELS.get(st.session_state.selected_model, {})
+                    supports_vision = model_config.get("supports_vision", False)
+                    file_api_model = st.session_state.selected_model if model_config.get("file_api") else None
+                    langchain_messages = apply_history_window(
+                        sync_langchain_messages(st.session_state, supports_vision, file_api_model, to_langchain_message),
+                        chat_config.get("history_window", 20)
+                    )
+                    
+                    if len(user_messages) == 1:
+                        # AIから応答をストリーミングで取得し、逐次表示
+                        with st.chat_message("assistant"):
+                            placeholder = st.empty()
+                            with placeholder.container():
+                                ai_response = st.write_stream(stream_response_text(model, langchain_messages))
+                            # 表示中は断片ごとのサニタイズを避け、完了後に履歴表示と同じサニタイズ済みの内容に置き換える
+                            assistant_message = build_assistant_message(ai_response)
+                            placeholder.markdown(assistant_message["_display"])
+                        
+                        # AIの応答を履歴に追加して保存
+                        st.session_state.messages.append(assistant_message)
+                        save_ai_response(ai_response)
+                    else:
+                        # 複数ファイルは互いに独立した質問として、直近の履歴を共有しつつまとめて送信
+                        request_batch = [
+                            [*langchain_messages, to_langchain_message(user_message_data, supports_vision, file_api_model)]
+                            for user_message_data in user_messages
+                        ]
+                        placeholders = []
+                        for user_message_data in user_messages:
+                            render_message(user_message_data)
+                            with st.chat_message("assistant"):
+                                placeholders.append(st.empty())
+                        
+                        # 応答は完了した順に表示
+                        assistant_messages = [None] * len(user_messages)
+                        for index, result in model.batch_as_completed(request_batch, config={"max_concurrency": 5}):
+                            assistant_messages[index] = build_assistant_message(result.text)
+                            placeholders[index].markdown(assistant_messages[index]["_display"])
+                        
+                        # ファイルごとの質問と応答の組を履歴に追加して保存
+                        for user_message_data, assistant_message in zip(user_messages, assistant_messages):
+                            st.session_state.messages.append(user_message_data)
+                            started_new_conversation = save_user_message_data(user_message_data) or started_new_conversation
+                            st.session_state.messages.append(assistant_message)
+                            save_ai_response(assistant_message["content"])
+                    
+                    # 今回のやり取りは表示済みのため、通常は再実行せず履歴全体の再描画を省く
+                    # サイドバーはフラグメント外のため、アップローダーのリセット（ファイル送信後）と
+                    # 履歴一覧への新規会話の追加が必要な場合のみページ全体を1回だけ再実行する
+                    if uploads:
+                        st.session_state.file_uploader_key += 1
+                    if uploads or started_new_conversation:
+                        st.rerun()
             
-        except Exception as e:
-            error_message = str(e)
-            st.error(f"エラーが発生しました: {error_message}")
+            except Exception as e:
+                error_message = str(e)
+                st.error(f"エラーが発生しました: {error_message}")
             
-            # エラーの種類に応じて適切なアドバイスを表示
-            if "401" in error_message or "Unauthorized" in error_message:
-                st.info("🔑 APIキーが無効です。正しいAPIキーを設定してください。")
-            elif "403" in error_message or "Forbidden" in error_message:
-                st.info("🚫 APIキーの権限が不足しています。APIキーの設定を確認してください。")
-            elif "429" in error_message or "rate_limit" in error_message.lower():
-                st.info("⏱️ レート制限に達しました。しばらく待ってから再試行してください。")
-            elif "529" in error_message or "overloaded" in error_message.lower():
-                st.info("⚡ サーバーが過負荷状態です。しばらく待ってから再試行してください。")
-            elif "500" in error_message or "502" in error_message or "503" in error_message:
-                st.info("🔧 サーバーで一時的な問題が発生しています。しばらく待ってから再試行してください。")
-            else:
-                st.info("💡 問題が解決しない場合は、APIキーの設定やネットワーク接続を確認してください。")
+                # エラーの種類に応じて適切なアドバイスを表示
+                st.info(get_error_advice(error_message))
+
+render_chat()
@@ -2,7 +2,7 @@
 AIモデル管理パッケージ
 """
 from .config import ModelConfig, DEFAULT_TEMPERATURE, DEFAULT_MAX_TOKENS
-from .factory import create_model, get_available_models, check_model_availability
+from .factory import create_model, get_available_models, check_model_availability, upload_image_file
 
 __all__ = [
     "ModelConfig",
@@ -10,5 +10,6 @@ __all__ = [
     "DEFAULT_MAX_TOKENS",
     "create_model",
     "get_available_models", 
-    "check_model_availability"
+    "check_model_availability",
+    "upload_image_file"
 ]
\ No newline at end of file
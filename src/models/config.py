@@ -30,14 +30,16 @@ class ModelConfig:
             "model_name": "claude-sonnet-4-20250514",
             "api_key_env": "ANTHROPIC_API_KEY", 
             "description": "スマートで効率的な日常使いに最適なモデル",
-            "supports_vision": True
+            "supports_vision": True,
+            "file_api": True  # 画像をFiles APIでアップロードしファイルIDで参照
         },
         "Claude Opus 4": {
             "provider": "anthropic",
             "model_name": "claude-opus-4-20250514",
             "api_key_env": "ANTHROPIC_API_KEY",
             "description": "世界最高のコーディングモデル、最も知的なAI",
-            "supports_vision": True
+            "supports_vision": True,
+            "file_api": True  # 画像をFiles APIでアップロードしファイルIDで参照
         },
         "Gemini 2.5 Flash": {
             "provider": "google", 
@@ -3,10 +3,10 @@ AIモデルのファクトリー関数
 """
 import os
 import logging
-from typing import Dict, Any, Optional
-from langchain_openai import ChatOpenAI
-from langchain_anthropic import ChatAnthropic
-from langchain_google_genai import ChatGoogleGenerativeAI
+from functools import lru_cache
+from importlib import import_module
+from types import MappingProxyType
+from typing import Dict, Any, Mapping, Optional
 from langchain_core.language_models import BaseChatModel
 
 from .config import ModelConfig, DEFAULT_TEMPERATURE, DEFAULT_MAX_TOKENS
@@ -14,6 +14,23 @@ from .config import ModelConfig, DEFAULT_TEMPERATURE, DEFAULT_MAX_TOKENS
 # ロガーの設定
 logger = logging.getLogger(__name__)
 
+# AnthropicのFiles API（ベータ）を利用するためのヘッダー値
+ANTHROPIC_FILES_API_BETA = "files-api-2025-04-14"
+
+# プロバイダーごとのモデルクラス（モジュール名, クラス名）とAPIキーの引数名
+# SDKは読み込みが重いため、クラスは実際に使用するときに遅延インポートする
+_PROVIDERS = {
+    "openai": ("langchain_openai", "ChatOpenAI", "openai_api_key"),
+    "anthropic": ("langchain_anthropic", "ChatAnthropic", "anthropic_api_key"),
+    "google": ("langchain_google_genai", "ChatGoogleGenerativeAI", "google_api_key"),
+}
+
+# Files APIを利用するモデルに追加するパラメータ
+# （ファイルIDで参照した画像を送信するにはメッセージAPIにもベータヘッダーが必要）
+_FILE_API_PARAMS = {
+    "anthropic": {"betas": [ANTHROPIC_FILES_API_BETA]},
+}
+
 def create_model(model_name: str, **kwargs) -> Optional[BaseChatModel]:
     """
     指定されたモデル名に基づいてLangChainモデルインスタンスを作成
@@ -34,51 +51,97 @@ def create_model(model_name: str, **kwargs) -> Optional[BaseChatModel]:
     if not api_key:
         return None
     
+    provider = _PROVIDERS.get(config["provider"])
+    if provider is None:
+        logger.error(f"未対応のプロバイダー: {config['provider']} (モデル: {model_name})")
+        return None
+    module_name, class_name, api_key_arg = provider
+    
     # デフォルトパラメータ
-    default_params = {
+    params = {
+        "model": config["model_name"],
+        api_key_arg: api_key,
         "temperature": kwargs.get("temperature", DEFAULT_TEMPERATURE),
         "max_tokens": kwargs.get("max_tokens", DEFAULT_MAX_TOKENS)
     }
+    if config.get("file_api"):
+        params.update(_FILE_API_PARAMS.get(config["provider"], {}))
     
     try:
-        if config["provider"] == "openai":
-            return ChatOpenAI(
-                model=config["model_name"],
-                openai_api_key=api_key,
-                **default_params
-            )
-        elif config["provider"] == "anthropic":
-            return ChatAnthropic(
-                model=config["model_name"],
-                anthropic_api_key=api_key,
-                **default_params
-            )
-        elif config["provider"] == "google":
-            return ChatGoogleGenerativeAI(
-                model=config["model_name"],
-                google_api_key=api_key,
-                **default_params
+        model_class = getattr(import_module(module_name), class_name)
+        return model_class(**params)
+    except Exception as e:
+        logger.error(f"モデル作成エラー: {e}")
+        return None
+
+@lru_cache(maxsize=4)
+def _get_anthropic_client(api_key: str):
+    """
+    Files API用のAnthropicクライアントを取得（APIキーごとにキャッシュし、接続プールを使い回す）
+    
+    Args:
+        api_key: AnthropicのAPIキー
+        
+    Returns:
+        Anthropic: APIクライアント
+    """
+    from anthropic import Anthropic
+    return Anthropic(api_key=api_key)
+
+def upload_image_file(model_name: str, data: bytes, file_name: str, mime_type: str) -> Optional[str]:
+    """
+    画像をプロバイダーのFiles APIにアップロードし、以降のリクエストで参照するファイルIDを取得
+    
+    Args:
+        model_name: モデル名（ModelConfig.MODELSのキー）
+        data: 画像ファイルのバイト列
+        file_name: ファイル名
+        mime_type: 画像のMIMEタイプ
+        
+    Returns:
+        str: アップロードしたファイルのID、または None（Files API非対応・エラー時）
+    """
+    config = ModelConfig.MODELS.get(model_name)
+    if not config or not config.get("file_api"):
+        return None
+    
+    api_key = os.getenv(config["api_key_env"])
+    if not api_key:
+        return None
+    
+    try:
+        if config["provider"] == "anthropic":
+            client = _get_anthropic_client(api_key)
+            uploaded = client.beta.files.upload(
+                file=(file_name, data, mime_type),
+                betas=[ANTHROPIC_FILES_API_BETA]
             )
+            logger.info(f"画像をFiles APIにアップロードしました: {file_name} ({uploaded.id})")
+            return uploaded.id
         else:
-            logger.error(f"未対応のプロバイダー: {config['provider']} (モデル: {model_name})")
+            logger.warning(f"Files API未対応のプロバイダー: {config['provider']} (モデル: {model_name})")
             return None
     except Exception as e:
-        logger.error(f"モデル作成エラー: {e}")
+        logger.error(f"画像のアップロードエラー: {e}")
         return None
 
-def get_available_models() -> Dict[str, Dict[str, Any]]:
+@lru_cache(maxsize=1)
+def get_available_models() -> Mapping[str, Dict[str, Any]]:
     """
     利用可能なモデルの一覧を取得（APIキーが設定されているもののみ）
     
+    環境変数はプロセス内で変わらない前提のため、結果はキャッシュし読み取り専用で返す
+    （テストなどで環境変数を変更した場合は get_available_models.cache_clear() を呼ぶ）
+    
     Returns:
-        Dict: 利用可能なモデルの辞書
+        Mapping: 利用可能なモデルの辞書（読み取り専用）
     """
     available = {}
     for model_name, config in ModelConfig.MODELS.items():
         api_key = os.getenv(config["api_key_env"])
         if api_key:
             available[model_name] = config
-    return available
+    return MappingProxyType(available)
 
 def check_model_availability(model_name: str) -> bool:
     """
@@ -90,9 +153,4 @@ def check_model_availability(model_name: str) -> bool:
     Returns:
         bool: 利用可能な場合True
     """
-    if model_name not in ModelConfig.MODELS:
-        return False
-    
-    config = ModelConfig.MODELS[model_name]
-    api_key = os.getenv(config["api_key_env"])
-    return bool(api_key)
\ No newline at end of file
+    return model_name in get_available_models()
@@ -3,7 +3,7 @@
 """
 from .logging import setup_logging, get_logger
 from .config import load_config, get_app_config, get_logging_config, get_chat_config, get_file_upload_config, get_history_config
-from .file_processing import process_image, process_pdf, get_file_type, format_file_content_for_ai, encode_image_to_base64, get_image_mime_type
+from .file_processing import process_image, process_pdf, get_file_type, format_file_content_for_ai, encode_image_to_base64, encode_image_for_upload, encode_bytes_to_base64, get_image_mime_type
 
 __all__ = [
     "setup_logging",
@@ -19,5 +19,7 @@ __all__ = [
     "get_file_type",
     "format_file_content_for_ai",
     "encode_image_to_base64",
+    "encode_image_for_upload",
+    "encode_bytes_to_base64",
     "get_image_mime_type"
 ]
\ No newline at end of file
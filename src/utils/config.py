@@ -3,9 +3,13 @@
 """
 import os
 import yaml
+from functools import lru_cache
 from pathlib import Path
 from typing import Dict, Any
 
+# libyamlが利用可能ならC実装のパーサーを使う（純Python実装より高速）
+_YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
 def load_config(config_path: str = None) -> Dict[str, Any]:
     """
     設定ファイルを読み込み
@@ -38,29 +42,50 @@ def load_config(config_path: str = None) -> Dict[str, Any]:
             }
         }
     
-    with open(config_path, 'r', encoding='utf-8') as f:
-        return yaml.safe_load(f)
+    # 更新日時をキーに含め、ファイルが変更されたときだけ読み直す
+    return _load_config_file(str(config_path), os.stat(config_path).st_mtime)
+
+@lru_cache(maxsize=4)
+def _load_config_file(config_path: str, mtime: float) -> Dict[str, Any]:
+    """
+    設定ファイルを読み込んでパース（パスと更新日時ごとにキャッシュ）
+    
+    Args:
+        config_path: 設定ファイルのパス
+        mtime: 設定ファイルの更新日時（キャッシュキー用）
+        
+    Returns:
+        Dict: 設定辞書
+    """
+    with open(config_path, 'rb') as f:
+        return yaml.load(f, Loader=_YAML_LOADER)
 
+# 各セクションの取得はStreamlitの再実行ごとに呼ばれるため、YAMLの読み込みは初回のみ行う
+@lru_cache(maxsize=1)
 def get_app_config() -> Dict[str, Any]:
     """アプリケーション設定を取得"""
     config = load_config()
     return config.get("app", {})
 
+@lru_cache(maxsize=1)
 def get_logging_config() -> Dict[str, Any]:
     """ログ設定を取得"""
     config = load_config()
     return config.get("logging", {})
 
+@lru_cache(maxsize=1)
 def get_chat_config() -> Dict[str, Any]:
     """チャット設定を取得"""
     config = load_config()
     return config.get("chat", {})
 
+@lru_cache(maxsize=1)
 def get_file_upload_config() -> Dict[str, Any]:
     """ファイルアップロード設定を取得"""
     config = load_config()
     return config.get("file_upload", {})
 
+@lru_cache(maxsize=1)
 def get_history_config() -> Dict[str, Any]:
     """履歴管理設定を取得"""
     config = load_config()
@@ -8,74 +8,244 @@ import json
 import base64
 from datetime import datetime
 from pathlib import Path
-from typing import List, Dict, Optional, Any
+from typing import List, Dict, Optional, Any, Tuple, Iterator
 from PIL import Image
 import io
 import logging
+import threading
+import weakref
+from contextlib import contextmanager
 
 logger = logging.getLogger(__name__)
 
+# 結果セットを読み込む際に1回で取得する行数
+_FETCH_BATCH_SIZE = 64
+
+# ファイルを作成せずメモリ上にデータベースを作成する場合のパス（テスト等で使用）
+MEMORY_DB_PATH = ":memory:"
+
+# 画像をPNGで保存する際の圧縮レベル（可逆のまま、既定値(6)より圧縮を軽くして保存を速くする）
+_PNG_STORE_COMPRESS_LEVEL = 3
+
+# メッセージ追加のSQL（sqlite3は接続ごとにSQL文字列単位でコンパイル済みの文をキャッシュするため、
+# 1件保存と一括保存で同じ文字列を使い、解析・実行計画の作成を1回で済ませる）
+_INSERT_MESSAGE_SQL = '''
+    INSERT INTO messages (conversation_id, role, content, has_image, image_data, image_format)
+    VALUES (?, ?, ?, ?, ?, ?)
+'''
+
 class ChatHistoryDatabase:
-    """チャット履歴データベース管理クラス"""
+    """
+    チャット履歴データベース管理クラス
+    
+    インスタンスはデータベースファイルごとに1つだけ作成し、同じパスで生成した場合は
+    既存のインスタンス（接続）を返す（Streamlitの再実行ごとの初期化を避ける）
+    """
+    
+    _instances: Dict[Path, "ChatHistoryDatabase"] = {}
+    _instances_lock = threading.Lock()
+    
+    def __new__(cls, db_path: str = "chat_history.db"):
+        # メモリ上のデータベースはカレントディレクトリのファイルと区別するため解決しない
+        key = Path(db_path) if db_path == MEMORY_DB_PATH else Path(db_path).resolve()
+        with cls._instances_lock:
+            instance = cls._instances.get(key)
+            if instance is None:
+                instance = super().__new__(cls)
+                instance._instance_key = key
+                instance._initialized = False
+                cls._instances[key] = instance
+            return instance
     
     def __init__(self, db_path: str = "chat_history.db"):
         """
-        データベース初期化
+        データベース初期化（同じパスのインスタンスでは初回のみ実行）
         
         Args:
-            db_path: データベースファイルのパス
+            db_path: データベースファイルのパス（MEMORY_DB_PATHの場合はメモリ上に作成し、閉じると破棄される）
         """
-        self.db_path = Path(db_path)
-        self.init_database()
+        with self._instances_lock:
+            if self._initialized:
+                return
+            
+            self.db_path = Path(db_path)
+            # 接続はインスタンスで1つを使い回す（履歴の書き込みスレッドとも共有するためロックで保護）
+            self._lock = threading.RLock()
+            self._conn = self._connect()
+            self._finalizer = weakref.finalize(self, self._conn.close)
+            self.init_database()
+            self._initialized = True
+    
+    def _connect(self) -> sqlite3.Connection:
+        """
+        チューニング用のPRAGMAを適用した接続を作成
+        
+        Returns:
+            SQLite接続
+        """
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        # journal_mode以外のPRAGMAは接続ごとの設定のため、接続作成時に適用する
+        # （WALではsynchronous=NORMALでも破損せず、コミットごとのfsyncを省ける）
+        conn.executescript('''
+            PRAGMA synchronous=NORMAL;
+            PRAGMA temp_store=MEMORY;
+            PRAGMA mmap_size=134217728;
+            PRAGMA cache_size=-20000;
+            PRAGMA foreign_keys=ON;
+        ''')
+        return conn
+    
+    @contextmanager
+    def _connection(self):
+        """
+        共有接続をロックを取得して使用
+        ブロックを正常に抜けるとコミット、例外時はロールバックする
+        """
+        with self._lock, self._conn:
+            yield self._conn
+    
+    def close(self):
+        """データベース接続を閉じる（以降に同じパスで生成すると新しいインスタンスになる）"""
+        with self._instances_lock:
+            if self._instances.get(self._instance_key) is self:
+                del self._instances[self._instance_key]
+        with self._lock:
+            self._finalizer()
     
     def init_database(self):
         """データベーステーブルを初期化"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connection() as conn:
             cursor = conn.cursor()
             
-            # conversationsテーブル（会話セッション管理）
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS conversations (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    session_id TEXT UNIQUE NOT NULL,
-                    title TEXT,
-                    model_name TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
+            # 書き込み中も他の接続から読み込めるようWALモードにする（設定はファイルに保存される）
+            cursor.execute('PRAGMA journal_mode=WAL')
             
-            # messagesテーブル（メッセージ管理）
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS messages (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    conversation_id INTEGER NOT NULL,
-                    role TEXT NOT NULL CHECK (role IN ('user', 'assistant')),
-                    content TEXT NOT NULL,
-                    has_image BOOLEAN DEFAULT FALSE,
-                    image_data TEXT,
-                    image_format TEXT,
-                    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (conversation_id) REFERENCES conversations(id) ON DELETE CASCADE
-                )
-            ''')
+            self._create_schema(cursor)
             
-            # インデックス作成
-            cursor.execute('''
-                CREATE INDEX IF NOT EXISTS idx_conversations_session_id 
-                ON conversations(session_id)
-            ''')
-            cursor.execute('''
-                CREATE INDEX IF NOT EXISTS idx_messages_conversation_id 
-                ON messages(conversation_id)
-            ''')
+            conn.commit()
+            logger.info("データベース初期化完了: %s", self.db_path)
+    
+    def _create_schema(self, cursor: sqlite3.Cursor):
+        """
+        テーブル・インデックス・全文検索インデックスを作成（作成済みのものはそのまま）
+        
+        Args:
+            cursor: 初期化中の接続のカーソル
+        """
+        # conversationsテーブル（会話セッション管理）
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS conversations (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                session_id TEXT UNIQUE NOT NULL,
+                title TEXT,
+                model_name TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        
+        # messagesテーブル（メッセージ管理）
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS messages (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                conversation_id INTEGER NOT NULL,
+                role TEXT NOT NULL CHECK (role IN ('user', 'assistant')),
+                content TEXT NOT NULL,
+                has_image BOOLEAN DEFAULT FALSE,
+                image_data BLOB,
+                image_format TEXT,
+                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (conversation_id) REFERENCES conversations(id) ON DELETE CASCADE
+            )
+        ''')
+        
+        # インデックス作成
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_conversations_session_id 
+            ON conversations(session_id)
+        ''')
+        # 会話ごとのメッセージを時系列順にインデックスだけで取得できるよう複合インデックスにする
+        # （conversation_id単独のインデックスは複合インデックスの先頭列で代替できるため削除）
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_messages_conversation_timestamp 
+            ON messages(conversation_id, timestamp)
+        ''')
+        cursor.execute('DROP INDEX IF EXISTS idx_messages_conversation_id')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_messages_timestamp 
+            ON messages(timestamp)
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_conversations_updated_at 
+            ON conversations(updated_at DESC, session_id DESC)
+        ''')
+        
+        self._fts_enabled = self._init_fts(cursor)
+    
+    def _init_fts(self, cursor: sqlite3.Cursor) -> bool:
+        """
+        メッセージ検索用の全文検索インデックス（FTS5）を初期化
+        
+        日本語は単語の区切りがないため、部分一致で検索できるtrigramトークナイザーを使用する
+        
+        Args:
+            cursor: 初期化中の接続のカーソル
+            
+        Returns:
+            全文検索が利用可能な場合True（FTS5非対応のSQLiteではFalse）
+        """
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'messages_fts'")
+        exists = cursor.fetchone() is not None
+        
+        try:
             cursor.execute('''
-                CREATE INDEX IF NOT EXISTS idx_messages_timestamp 
-                ON messages(timestamp)
+                CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+                    content, content='messages', content_rowid='id', tokenize='trigram'
+                )
             ''')
+        except sqlite3.OperationalError as e:
+            logger.warning("全文検索を利用できません。LIKE検索を使用します: %s", e)
+            return False
+        
+        # messagesテーブルの変更をインデックスに反映するトリガー
+        # （executescriptは実行前にコミットするため、トランザクション内で使えるよう1文ずつ実行）
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages BEGIN
+                INSERT INTO messages_fts(rowid, content) VALUES (new.id, new.content);
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS messages_fts_delete AFTER DELETE ON messages BEGIN
+                INSERT INTO messages_fts(messages_fts, rowid, content) VALUES ('delete', old.id, old.content);
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS messages_fts_update AFTER UPDATE OF content ON messages BEGIN
+                INSERT INTO messages_fts(messages_fts, rowid, content) VALUES ('delete', old.id, old.content);
+                INSERT INTO messages_fts(rowid, content) VALUES (new.id, new.content);
+            END
+        ''')
+        
+        # 既存のデータベースに追加した場合は、保存済みのメッセージからインデックスを作成
+        if not exists:
+            cursor.execute("INSERT INTO messages_fts(messages_fts) VALUES ('rebuild')")
+        return True
+    
+    def table_exists(self, name: str) -> bool:
+        """
+        指定した名前のテーブルが存在するか確認
+        
+        Args:
+            name: テーブル名
             
-            conn.commit()
-            logger.info(f"データベース初期化完了: {self.db_path}")
+        Returns:
+            存在する場合True
+        """
+        with self._connection() as conn:
+            cursor = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)
+            )
+            return cursor.fetchone() is not None
     
     def create_conversation(self, session_id: str, title: str = None, model_name: str = None) -> int:
         """
@@ -89,7 +259,7 @@ class ChatHistoryDatabase:
         Returns:
             作成された会話のID
         """
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connection() as conn:
             cursor = conn.cursor()
             cursor.execute('''
                 INSERT INTO conversations (session_id, title, model_name)
@@ -97,7 +267,7 @@ class ChatHistoryDatabase:
             ''', (session_id, title, model_name))
             conversation_id = cursor.lastrowid
             conn.commit()
-            logger.debug(f"新しい会話作成: ID={conversation_id}, session_id={session_id}")
+            logger.debug("新しい会話作成: ID=%s, session_id=%s", conversation_id, session_id)
             return conversation_id
     
     def get_conversation_id(self, session_id: str) -> Optional[int]:
@@ -110,7 +280,7 @@ class ChatHistoryDatabase:
         Returns:
             会話ID（存在しない場合はNone）
         """
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connection() as conn:
             cursor = conn.cursor()
             cursor.execute('''
                 SELECT id FROM conversations WHERE session_id = ?
@@ -119,7 +289,8 @@ class ChatHistoryDatabase:
             return result[0] if result else None
     
     def save_message(self, session_id: str, role: str, content: str, 
-                    image: Optional[Image.Image] = None, model_name: str = None) -> int:
+                    image: Optional[Image.Image] = None, model_name: str = None,
+                    image_bytes: Optional[bytes] = None) -> int:
         """
         メッセージを保存
         
@@ -129,188 +300,365 @@ class ChatHistoryDatabase:
             content: メッセージ内容
             image: 画像データ（オプション）
             model_name: 使用モデル名（会話作成時のみ）
+            image_bytes: 画像の元ファイルのバイト列（オプション。あれば再エンコードせずに保存）
             
         Returns:
             保存されたメッセージのID
         """
-        # 会話IDを取得または作成
-        conversation_id = self.get_conversation_id(session_id)
-        if conversation_id is None:
-            # タイトルは最初のユーザーメッセージから生成
-            title = content[:50] + "..." if len(content) > 50 else content
-            conversation_id = self.create_conversation(session_id, title, model_name)
-        
-        # 画像データを処理
-        image_data = None
-        image_format = None
-        has_image = False
+        image_data, image_format = self._encode_image(image, image_bytes)
         
-        if image is not None:
-            has_image = True
-            image_format = image.format or "PNG"
-            
-            # 画像をbase64エンコード
-            buffer = io.BytesIO()
-            image.save(buffer, format=image_format)
-            image_data = base64.b64encode(buffer.getvalue()).decode('utf-8')
-        
-        with sqlite3.connect(self.db_path) as conn:
+        # 会話の取得・作成とメッセージの追加を1つの接続・トランザクションで行う
+        with self._connection() as conn:
             cursor = conn.cursor()
-            cursor.execute('''
-                INSERT INTO messages (conversation_id, role, content, has_image, image_data, image_format)
-                VALUES (?, ?, ?, ?, ?, ?)
-            ''', (conversation_id, role, content, has_image, image_data, image_format))
+            conversation_id = self._upsert_conversation(cursor, session_id, content, model_name)
             
-            # 会話の更新日時を更新
-            cursor.execute('''
-                UPDATE conversations SET updated_at = CURRENT_TIMESTAMP WHERE id = ?
-            ''', (conversation_id,))
+            cursor.execute(_INSERT_MESSAGE_SQL,
+                           (conversation_id, role, content, image is not None, image_data, image_format))
             
             message_id = cursor.lastrowid
             conn.commit()
             
-            logger.debug(f"メッセージ保存: ID={message_id}, role={role}, has_image={has_image}")
+            logger.debug("メッセージ保存: ID=%s, role=%s, has_image=%s", message_id, role, image is not None)
             return message_id
     
-    def load_messages(self, session_id: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    def save_messages_bulk(self, session_id: str, messages: List[Dict[str, Any]], 
+                           model_name: str = None) -> int:
+        """
+        複数のメッセージを1つのトランザクションでまとめて保存
+        
+        Args:
+            session_id: セッションID
+            messages: メッセージのリスト（"role", "content", 任意で"image"・"image_bytes"を持つ辞書）
+            model_name: 使用モデル名（会話作成時のみ）
+            
+        Returns:
+            保存したメッセージ数
+        """
+        if not messages:
+            return 0
+        
+        rows = []
+        for msg in messages:
+            image = msg.get("image")
+            image_data, image_format = self._encode_image(image, msg.get("image_bytes"))
+            rows.append((msg["role"], msg["content"], image is not None, image_data, image_format))
+        
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            conversation_id = self._upsert_conversation(cursor, session_id, messages[0]["content"], model_name)
+            
+            cursor.executemany(_INSERT_MESSAGE_SQL, [(conversation_id, *row) for row in rows])
+            conn.commit()
+        
+        logger.debug("メッセージ一括保存: session_id=%s, count=%s", session_id, len(rows))
+        return len(rows)
+    
+    @staticmethod
+    def _upsert_conversation(cursor: sqlite3.Cursor, session_id: str, content: str, model_name: str = None) -> int:
+        """
+        会話がなければ作成し、あれば更新日時を更新して会話IDを取得
+        
+        Args:
+            cursor: トランザクション中のカーソル
+            session_id: セッションID
+            content: タイトルの元にする最初のメッセージ内容（会話作成時のみ使用）
+            model_name: 使用モデル名（会話作成時のみ使用）
+            
+        Returns:
+            会話ID
+        """
+        title = content[:50] + "..." if len(content) > 50 else content
+        cursor.execute('''
+            INSERT INTO conversations (session_id, title, model_name)
+            VALUES (?, ?, ?)
+            ON CONFLICT(session_id) DO UPDATE SET updated_at = CURRENT_TIMESTAMP
+            RETURNING id
+        ''', (session_id, title, model_name))
+        return cursor.fetchone()[0]
+    
+    @staticmethod
+    def _encode_image(image: Optional[Image.Image],
+                      image_bytes: Optional[bytes] = None) -> Tuple[Optional[bytes], Optional[str]]:
+        """
+        画像を保存用のバイト列にエンコード
+        
+        Args:
+            image: 画像データ（なければNone）
+            image_bytes: 画像の元ファイルのバイト列（なければNone）
+            
+        Returns:
+            (画像のバイト列, 画像フォーマット)。画像がない場合は (None, None)
+        """
+        if image is None:
+            return None, None
+        
+        # 元ファイルのまま（縮小などしていない）画像は、デコード・再エンコードせずに元のバイト列を保存
+        if image_bytes is not None and image.format:
+            return image_bytes, image.format
+        
+        # 画像はエンコード後のバイト列をそのままBLOBとして保存
+        image_format = image.format or "PNG"
+        buffer = io.BytesIO()
+        if image_format == "PNG":
+            image.save(buffer, format=image_format, compress_level=_PNG_STORE_COMPRESS_LEVEL)
+        else:
+            image.save(buffer, format=image_format)
+        return buffer.getvalue(), image_format
+    
+    def _iter_rows(self, id_query: str, params: Tuple, row_query: str) -> Iterator[Tuple]:
+        """
+        結果の行を_FETCH_BATCH_SIZE件ずつ取得して1行ずつ返す
+        
+        最初に結果のメッセージIDだけを順に取得して対象を確定し、行の内容はIDを指定して
+        バッチごとに別のクエリで取得する。共有接続のロックは各クエリの実行中だけ保持し、
+        ロックを解放している間は開いたままのカーソルを残さないため、読み込み途中で
+        他の処理（同じスレッドを含む）が書き込んでも、対象の行が増えたりテーブルがロックされたりしない
+        （読み込み途中で削除された行は返さない）
+        
+        Args:
+            id_query: 結果のメッセージIDを返す順に取得するSELECT文
+            params: id_queryのパラメータ
+            row_query: 1列目がメッセージIDの行を取得するSELECT文（"{ids}"をIDのプレースホルダーに置き換える）
+            
+        Yields:
+            row_queryの結果の各行（id_queryの順）
+        """
+        with self._lock:
+            message_ids = [row[0] for row in self._conn.execute(id_query, params)]
+        
+        for start in range(0, len(message_ids), _FETCH_BATCH_SIZE):
+            batch = message_ids[start:start + _FETCH_BATCH_SIZE]
+            with self._lock:
+                rows = self._conn.execute(row_query.format(ids=",".join("?" * len(batch))), batch).fetchall()
+            rows_by_id = {row[0]: row for row in rows}
+            yield from (rows_by_id[message_id] for message_id in batch if message_id in rows_by_id)
+    
+    def iter_messages(self, session_id: str, limit: Optional[int] = None, offset: int = 0,
+                      include_images: bool = True, latest: bool = False) -> Iterator[Dict[str, Any]]:
+        """
+        セッションのメッセージを時系列順に1件ずつ返す（引数は load_messages と同じ）
+        
+        Yields:
+            メッセージ
+        """
+        id_query = f'''
+            SELECT id, timestamp
+            FROM messages 
+            WHERE conversation_id = (SELECT id FROM conversations WHERE session_id = ?)
+            ORDER BY timestamp {"DESC" if latest else "ASC"}, id {"DESC" if latest else "ASC"}
+            LIMIT ? OFFSET ?
+        '''
+        if latest:
+            # 最新のlimit件を取り出してから時系列順に並べ直す
+            id_query = f"SELECT id, timestamp FROM ({id_query}) ORDER BY timestamp, id"
+        
+        # 画像が不要な場合はBLOB列を読み込まない
+        image_column = "image_data" if include_images else "NULL"
+        row_query = f'''
+            SELECT id, role, content, has_image, {image_column} AS image_data, timestamp
+            FROM messages
+            WHERE id IN ({{ids}})
+        '''
+        
+        for row in self._iter_rows(id_query, (session_id, limit if limit else -1, offset), row_query):
+            message_id, role, content, has_image, image_data, timestamp = row
+            
+            message = {
+                "id": message_id,
+                "role": role,
+                "content": content,
+                "has_image": bool(has_image),
+                "timestamp": timestamp
+            }
+            
+            # 画像データを復元
+            if has_image and image_data:
+                image = self._decode_image(image_data)
+                if image is not None:
+                    message["image"] = image
+            
+            yield message
+    
+    def load_messages(self, session_id: str, limit: Optional[int] = None, offset: int = 0,
+                     include_images: bool = True, latest: bool = False) -> List[Dict[str, Any]]:
         """
         セッションのメッセージを読み込み
         
         Args:
             session_id: セッションID
             limit: 取得するメッセージ数の上限
+            offset: 読み飛ばすメッセージ数
+            include_images: Falseの場合は画像データを読み込まない（画像は get_message_image で個別に取得）
+            latest: Trueの場合は最新のメッセージからlimit件を取得（結果は時系列順）
             
         Returns:
             メッセージのリスト
         """
-        conversation_id = self.get_conversation_id(session_id)
-        if conversation_id is None:
-            return []
+        messages = list(self.iter_messages(session_id, limit, offset, include_images, latest))
+        logger.debug("メッセージ読み込み: session_id=%s, count=%s", session_id, len(messages))
+        return messages
+    
+    def get_message_image(self, message_id: int) -> Optional[Image.Image]:
+        """
+        メッセージの画像を1件だけ読み込み
         
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            
-            query = '''
-                SELECT role, content, has_image, image_data, image_format, timestamp
-                FROM messages 
-                WHERE conversation_id = ?
-                ORDER BY timestamp ASC
-            '''
+        Args:
+            message_id: メッセージID
             
-            params = [conversation_id]
-            if limit:
-                query += ' LIMIT ?'
-                params.append(limit)
-            
-            cursor.execute(query, params)
-            rows = cursor.fetchall()
-            
-            messages = []
-            for row in rows:
-                role, content, has_image, image_data, _, timestamp = row
-                
-                message = {
-                    "role": role,
-                    "content": content,
-                    "timestamp": timestamp
-                }
-                
-                # 画像データを復元
-                if has_image and image_data:
-                    try:
-                        image_bytes = base64.b64decode(image_data)
-                        image = Image.open(io.BytesIO(image_bytes))
-                        message["image"] = image
-                    except Exception as e:
-                        logger.error(f"画像データの復元に失敗: {e}")
-                
-                messages.append(message)
-            
-            logger.debug(f"メッセージ読み込み: session_id={session_id}, count={len(messages)}")
-            return messages
+        Returns:
+            画像（画像がない場合・復元に失敗した場合はNone）
+        """
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT image_data FROM messages WHERE id = ? AND has_image
+            ''', (message_id,))
+            result = cursor.fetchone()
+        
+        if result is None or not result[0]:
+            return None
+        return self._decode_image(result[0])
     
-    def search_messages(self, query: str, limit: int = 50) -> List[Dict[str, Any]]:
+    @staticmethod
+    def _decode_image(image_data) -> Optional[Image.Image]:
         """
-        メッセージを検索（SQLインジェクション対策済み）
+        保存された画像データをPIL Imageに復元
         
         Args:
-            query: 検索クエリ
-            limit: 結果の上限数
+            image_data: 画像のバイト列（以前のバージョンで保存したものはbase64文字列）
             
         Returns:
-            検索結果のリスト
+            復元した画像（失敗時はNone）
+        """
+        try:
+            # 以前のバージョンで保存した画像はbase64文字列のため、その場合のみデコード
+            image_bytes = base64.b64decode(image_data) if isinstance(image_data, str) else image_data
+            return Image.open(io.BytesIO(image_bytes))
+        except Exception as e:
+            logger.error("画像データの復元に失敗: %s", e)
+            return None
+    
+    def iter_search_messages(self, query: str, limit: int = 50) -> Iterator[Dict[str, Any]]:
+        """
+        メッセージを検索し、見つかった順に1件ずつ返す（引数は search_messages と同じ）
+        
+        Yields:
+            検索結果
         """
         # 入力検証：SQLインジェクション対策
         if not query or not isinstance(query, str):
-            return []
+            return
         
         # 長さ制限（DoS攻撃対策）
         if len(query) > 1000:
             query = query[:1000]
         
-        # LIKE句特殊文字のエスケープ
-        escaped_query = query.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
-        search_pattern = f'%{escaped_query}%'
-        
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-                SELECT c.session_id, c.title, c.model_name, m.role, m.content, m.timestamp
-                FROM messages m
-                JOIN conversations c ON m.conversation_id = c.id
-                WHERE m.content LIKE ? ESCAPE '\\'
-                ORDER BY m.timestamp DESC
+        # trigramは3文字単位のインデックスのため、それより短いクエリはLIKEで検索する
+        if self._fts_enabled and len(query) >= 3:
+            # クエリ全体を1つのフレーズとして扱い、FTS5の演算子として解釈させない
+            phrase = '"' + query.replace('"', '""') + '"'
+            id_query = '''
+                SELECT m.id
+                FROM messages_fts
+                JOIN messages m ON m.id = messages_fts.rowid
+                WHERE messages_fts MATCH ?
+                ORDER BY bm25(messages_fts), m.timestamp DESC
                 LIMIT ?
-            ''', (search_pattern, limit))
-            
-            results = []
-            for row in cursor.fetchall():
-                session_id, title, model_name, role, content, timestamp = row
-                results.append({
-                    "session_id": session_id,
-                    "title": title,
-                    "model_name": model_name,
-                    "role": role,
-                    "content": content,
-                    "timestamp": timestamp
-                })
+            '''
+            params = (phrase, limit)
+        else:
+            # LIKE句特殊文字のエスケープ
+            escaped_query = query.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            search_pattern = f'%{escaped_query}%'
+            id_query = '''
+                SELECT id
+                FROM messages
+                WHERE content LIKE ? ESCAPE '\\'
+                ORDER BY timestamp DESC
+                LIMIT ?
+            '''
+            params = (search_pattern, limit)
+        
+        rows = self._iter_rows(id_query, params, '''
+            SELECT m.id, c.session_id, c.title, c.model_name, m.role, m.content, m.timestamp
+            FROM messages m
+            JOIN conversations c ON m.conversation_id = c.id
+            WHERE m.id IN ({ids})
+        ''')
+        
+        for _, session_id, title, model_name, role, content, timestamp in rows:
+            yield {
+                "session_id": session_id,
+                "title": title,
+                "model_name": model_name,
+                "role": role,
+                "content": content,
+                "timestamp": timestamp
+            }
+    
+    def search_messages(self, query: str, limit: int = 50) -> List[Dict[str, Any]]:
+        """
+        メッセージを検索（SQLインジェクション対策済み）
+        
+        Args:
+            query: 検索クエリ
+            limit: 結果の上限数
             
-            logger.debug(f"メッセージ検索: query='{query}', results={len(results)}")
-            return results
+        Returns:
+            検索結果のリスト
+        """
+        results = list(self.iter_search_messages(query, limit))
+        logger.debug("メッセージ検索: query='%s', results=%s", query, len(results))
+        return results
     
-    def get_conversations(self, limit: int = 100) -> List[Dict[str, Any]]:
+    def get_conversations(self, limit: int = 100, cursor: Optional[Tuple[str, str]] = None) -> List[Dict[str, Any]]:
         """
-        会話一覧を取得
+        会話一覧を取得（更新日時の新しい順）
         
         Args:
             limit: 取得数の上限
+            cursor: 前のページ最後の会話の (updated_at, session_id)。指定時はその続きから取得
             
         Returns:
             会話一覧
         """
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-                SELECT session_id, title, model_name, created_at, updated_at,
-                       (SELECT COUNT(*) FROM messages WHERE conversation_id = conversations.id) as message_count
-                FROM conversations
-                ORDER BY updated_at DESC
-                LIMIT ?
-            ''', (limit,))
+        # OFFSETを使わず、前ページの最後の行を起点にインデックスで続きを取得
+        where_clause = "WHERE (updated_at, session_id) < (?, ?)" if cursor else ""
+        params = (*cursor, limit) if cursor else (limit,)
+        
+        with self._connection() as conn:
+            db_cursor = conn.cursor()
+            # 先に対象の会話を絞り込んでから結合し、メッセージ数を1回の集計で取得
+            db_cursor.execute(f'''
+                SELECT c.session_id, c.title, c.model_name, c.created_at, c.updated_at,
+                       strftime('%m/%d %H:%M', c.updated_at) as updated_display,
+                       COUNT(m.id) as message_count
+                FROM (
+                    SELECT id, session_id, title, model_name, created_at, updated_at
+                    FROM conversations
+                    {where_clause}
+                    ORDER BY updated_at DESC, session_id DESC
+                    LIMIT ?
+                ) c
+                LEFT JOIN messages m ON m.conversation_id = c.id
+                GROUP BY c.id
+                ORDER BY c.updated_at DESC, c.session_id DESC
+            ''', params)
             
-            conversations = []
-            for row in cursor.fetchall():
-                session_id, title, model_name, created_at, updated_at, message_count = row
-                conversations.append({
+            # sqlite3.Rowを経由するより、タプルを展開して辞書を作る方が速い
+            return [
+                {
                     "session_id": session_id,
                     "title": title,
                     "model_name": model_name,
                     "created_at": created_at,
                     "updated_at": updated_at,
+                    "updated_display": updated_display,
                     "message_count": message_count
-                })
-            
-            return conversations
+                }
+                for session_id, title, model_name, created_at, updated_at, updated_display, message_count
+                in db_cursor.fetchall()
+            ]
     
     def delete_conversation(self, session_id: str) -> bool:
         """
@@ -322,7 +670,7 @@ class ChatHistoryDatabase:
         Returns:
             削除の成功可否
         """
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connection() as conn:
             cursor = conn.cursor()
             cursor.execute('''
                 DELETE FROM conversations WHERE session_id = ?
@@ -331,7 +679,7 @@ class ChatHistoryDatabase:
             conn.commit()
             
             if deleted:
-                logger.info(f"会話削除: session_id={session_id}")
+                logger.info("会話削除: session_id=%s", session_id)
             return deleted
     
     def clear_all_history(self) -> bool:
@@ -342,15 +690,20 @@ class ChatHistoryDatabase:
             削除の成功可否
         """
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._connection() as conn:
                 cursor = conn.cursor()
-                cursor.execute('DELETE FROM messages')
-                cursor.execute('DELETE FROM conversations')
+                # 1行ずつ削除する（全文検索インデックスの削除トリガーも行ごとに動く）より、
+                # テーブルごと削除して作り直す方が速いため、1つのトランザクションで再作成する
+                cursor.execute('BEGIN')
+                cursor.execute('DROP TABLE IF EXISTS messages_fts')
+                cursor.execute('DROP TABLE IF EXISTS messages')
+                cursor.execute('DROP TABLE IF EXISTS conversations')
+                self._create_schema(cursor)
                 conn.commit()
                 logger.info("全履歴削除完了")
                 return True
         except Exception as e:
-            logger.error(f"履歴削除エラー: {e}")
+            logger.error("履歴削除エラー: %s", e)
             return False
     
     def get_database_info(self) -> Dict[str, Any]:
@@ -360,7 +713,7 @@ class ChatHistoryDatabase:
         Returns:
             データベース統計情報
         """
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connection() as conn:
             cursor = conn.cursor()
             
             # 会話数
@@ -375,8 +728,11 @@ class ChatHistoryDatabase:
             cursor.execute('SELECT COUNT(*) FROM messages WHERE has_image = TRUE')
             image_message_count = cursor.fetchone()[0]
             
-            # データベースサイズ
-            db_size = self.db_path.stat().st_size if self.db_path.exists() else 0
+            # データベースサイズ（メモリ上のデータベースでも求められるようページ数から計算）
+            cursor.execute('PRAGMA page_count')
+            page_count = cursor.fetchone()[0]
+            cursor.execute('PRAGMA page_size')
+            db_size = page_count * cursor.fetchone()[0]
             
             return {
                 "conversation_count": conversation_count,
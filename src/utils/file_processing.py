@@ -3,18 +3,142 @@
 画像およびPDFファイルの処理機能を提供
 """
 import io
+import os
+import multiprocessing
 import base64
 import logging
 import html
-from typing import Optional, Tuple, Union
+import re
+import struct
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
+from itertools import repeat
+from typing import TYPE_CHECKING, Callable, List, Optional, Tuple, Union
 from PIL import Image
-import PyPDF2
-import pdfplumber
 import magic
-import bleach
+
+if TYPE_CHECKING:
+    import bleach
 
 logger = logging.getLogger(__name__)
 
+# 対応する拡張子とファイル種類の対応（呼び出しごとに作らないようモジュールレベルで定義）
+_EXTENSION_TO_FILE_TYPE = {
+    'jpg': 'image', 'jpeg': 'image', 'png': 'image',
+    'gif': 'image', 'bmp': 'image', 'webp': 'image',
+    'pdf': 'pdf',
+}
+
+# ファイル内容の検証で許可するMIMEタイプ
+_ALLOWED_MIME_TYPES = frozenset({
+    'image/png', 'image/jpeg', 'image/gif',
+    'image/bmp', 'image/webp', 'application/pdf'
+})
+
+# 対応形式の判定に必要な先頭バイト数
+# シグネチャ・BMPのDIBヘッダーサイズはいずれも先頭18バイト以内にある
+_MAGIC_HEADER_SIZE = 32
+
+# 先頭バイトで確実に判定できる形式のシグネチャ（一致しない場合のみlibmagicで判定する）
+_MIME_SIGNATURES = (
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'GIF87a', 'image/gif'),
+    (b'GIF89a', 'image/gif'),
+    (b'%PDF-', 'application/pdf'),
+)
+
+# BMPのDIBヘッダーとして有効なサイズ（BITMAPCOREHEADER〜BITMAPV5HEADER）
+_BMP_DIB_HEADER_SIZES = frozenset({12, 40, 52, 56, 64, 108, 124})
+
+# 生成時にマジックデータベースを読み込むため、インスタンスは使い回す
+_MAGIC = magic.Magic(mime=True)
+
+# PDFエンジンのデフォルトの優先順位（各エンジンはインポートに時間がかかるため、使用時にインポートする）
+# ネイティブ実装（PDFium）のpypdfium2が最も高速なため最初に使い、
+# 抽出できない場合のみPure PythonのPyPDF2、レイアウト解析を行う低速なpdfplumberの順に試す
+_DEFAULT_PDF_ENGINES = ("pypdfium2", "pypdf2", "pdfplumber")
+
+# Pure PythonのPDFエンジンでページを並列に抽出するワーカープロセス数と、並列化するページ数の下限
+# （ページ数が少ない場合はプロセス起動のコストの方が大きいため逐次処理する）
+_PDF_WORKERS = os.cpu_count() or 1
+_PARALLEL_PDF_MIN_PAGES = 4
+
+# サニタイズで除去する危険なURLスキームと、許可するHTMLタグ・属性
+_SCRIPT_BLOCK_RE = re.compile(r'<(script|style)\b[^>]*>.*?</\1\s*>', re.IGNORECASE | re.DOTALL)
+_DANGEROUS_SCHEME_RE = re.compile(r'(?:javascript|data|vbscript):', re.IGNORECASE)
+_ALLOWED_TAGS = frozenset({'b', 'i', 'u', 'em', 'strong', 'code', 'pre', 'br', 'p'})
+_ALLOWED_ATTRIBUTES = {}
+
+_cleaner_local = threading.local()
+
+# サニタイズ結果をキャッシュする入力の最大文字数
+_SANITIZE_CACHE_MAX_LENGTH = 16 * 1024
+
+# 送信用にPNGを保存する際の圧縮レベル（送信後に保存しないため、サイズより速度を優先する）
+_PNG_SEND_COMPRESS_LEVEL = 1
+
+# 出力を先頭から順に書き込むだけで保存でき、base64への逐次エンコードに使えるフォーマット
+# （TIFF・ICOなどはヘッダーを後から書き換えるためシークが必要になり、BytesIOに保存する）
+_STREAMING_SAVE_FORMATS = frozenset({"PNG", "JPEG", "JPG", "GIF", "BMP", "WEBP"})
+
+# 画像フォーマットとMIMEタイプの対応
+_FORMAT_TO_MIME = {
+    'PNG': 'image/png',
+    'JPEG': 'image/jpeg',
+    'JPG': 'image/jpeg',
+    'GIF': 'image/gif',
+    'BMP': 'image/bmp',
+    'WEBP': 'image/webp'
+}
+
+def _get_cleaner() -> "bleach.sanitizer.Cleaner":
+    """
+    スレッドごとのbleachのCleanerを取得（生成コストが高くスレッドセーフでないため、スレッドごとに使い回す）
+    
+    Returns:
+        Cleaner: 許可するタグ・属性を設定したCleaner
+    """
+    cleaner = getattr(_cleaner_local, "cleaner", None)
+    if cleaner is None:
+        # bleachはhtml5libを読み込み起動が遅くなるため、初めてサニタイズするときにインポートする
+        import bleach
+        cleaner = bleach.sanitizer.Cleaner(
+            tags=_ALLOWED_TAGS,
+            attributes=_ALLOWED_ATTRIBUTES,
+            strip=True
+        )
+        _cleaner_local.cleaner = cleaner
+    return cleaner
+
+def _sanitize(content: str) -> str:
+    """
+    ユーザー入力をサニタイズ（sanitize_user_input の本体）
+    
+    Args:
+        content: サニタイズするテキスト
+        
+    Returns:
+        str: サニタイズされた安全なテキスト
+    """
+    # scriptやstyleは中身ごと除去（bleachはタグのみを除去し、中身をテキストとして残すため）
+    content = _SCRIPT_BLOCK_RE.sub('', content)
+    
+    # 危険なJavaScriptプロトコルを大文字小文字を区別せずに除去
+    content = _DANGEROUS_SCHEME_RE.sub('', content)
+    
+    # bleachで危険なHTMLを除去（許可されたタグ以外のテキストはbleachがエスケープするため、
+    # 再度エスケープすると「&lt;」などが二重にエスケープされて表示が崩れる）
+    clean_content = _get_cleaner().clean(content)
+    
+    logger.debug("ユーザー入力をサニタイズしました: %s -> %s 文字", len(content), len(clean_content))
+    return clean_content
+
+# 同じメッセージはStreamlitの再実行のたびにサニタイズされるため結果をキャッシュする
+_sanitize_cached = lru_cache(maxsize=1024)(_sanitize)
+
 def sanitize_user_input(content: str) -> str:
     """
     ユーザー入力を安全な表示用にサニタイズ
@@ -30,35 +154,50 @@ def sanitize_user_input(content: str) -> str:
         return content
     
     try:
-        # 危険なJavaScriptプロトコルを大文字小文字を区別せずに除去
-        import re
-        content = re.sub(r'javascript:', '', content, flags=re.IGNORECASE)
-        content = re.sub(r'data:', '', content, flags=re.IGNORECASE)
-        content = re.sub(r'vbscript:', '', content, flags=re.IGNORECASE)
-        
-        # 安全なタグのみを許可
-        allowed_tags = ['b', 'i', 'u', 'em', 'strong', 'code', 'pre', 'br', 'p']
-        allowed_attributes = {}
-        
-        # bleachで危険なHTMLを除去（生のコンテンツに対して実行）
-        clean_content = bleach.clean(
-            content, 
-            tags=allowed_tags, 
-            attributes=allowed_attributes,
-            strip=True
-        )
-        
-        # HTMLエスケープ（許可されたタグ以外をエスケープ）
-        escaped_content = html.escape(clean_content)
-        
-        logger.debug(f"ユーザー入力をサニタイズしました: {len(content)} -> {len(escaped_content)} 文字")
-        return escaped_content
+        # 長大な入力はキャッシュに保持するとメモリを圧迫するためキャッシュしない
+        if len(content) > _SANITIZE_CACHE_MAX_LENGTH:
+            return _sanitize(content)
+        return _sanitize_cached(content)
         
     except Exception as e:
-        logger.error(f"サニタイズエラー: {e}")
+        logger.error("サニタイズエラー: %s", e)
         # エラーが発生した場合は基本的なHTMLエスケープのみ実行
         return html.escape(content)
 
+def _sniff_mime_type(header: bytes) -> Optional[str]:
+    """
+    ファイル先頭のシグネチャから対応形式のMIMEタイプを判定（libmagicを使わない高速判定）
+    
+    Args:
+        header: ファイル先頭のバイト列
+        
+    Returns:
+        str: MIMEタイプ（シグネチャが一致しない場合はNone）
+    """
+    for signature, mime_type in _MIME_SIGNATURES:
+        if header.startswith(signature):
+            return mime_type
+    # WebPはRIFFコンテナの8バイト目からフォーマット名が入る
+    if header[:4] == b'RIFF' and header[8:12] == b'WEBP':
+        return 'image/webp'
+    # BMPは「BM」だけでは判定が弱いため、14バイト目からのDIBヘッダーサイズも確認する
+    if header[:2] == b'BM' and len(header) >= 18 and struct.unpack_from('<I', header, 14)[0] in _BMP_DIB_HEADER_SIZES:
+        return 'image/bmp'
+    return None
+
+@lru_cache(maxsize=128)
+def _detect_mime_type(header: bytes) -> str:
+    """
+    ファイル先頭のバイト列からMIMEタイプを判定（同じファイルの再検証ではlibmagicを呼ばない）
+    
+    Args:
+        header: ファイル先頭のバイト列
+        
+    Returns:
+        str: MIMEタイプ
+    """
+    return _MAGIC.from_buffer(header)
+
 def validate_file_content(uploaded_file) -> bool:
     """
     ファイル内容をマジックバイトで検証
@@ -73,59 +212,203 @@ def validate_file_content(uploaded_file) -> bool:
         # ファイルポインタを先頭に戻す
         uploaded_file.seek(0)
         
-        # 最初の2048バイトを読み込んで検証
-        file_content = uploaded_file.read(2048)
+        # 先頭のバイト列を読み込んで検証
+        file_content = uploaded_file.read(_MAGIC_HEADER_SIZE)
         uploaded_file.seek(0)  # ポインタを先頭に戻す
         
-        # マジックバイトからMIMEタイプを取得
-        mime_type = magic.from_buffer(file_content, mime=True)
-        
-        # 許可されたMIMEタイプのセット
-        allowed_mime_types = {
-            'image/png', 'image/jpeg', 'image/gif', 
-            'image/bmp', 'image/webp', 'application/pdf'
-        }
+        # マジックバイトからMIMEタイプを取得（主要な形式はシグネチャで判定し、それ以外はlibmagicで判定）
+        mime_type = _sniff_mime_type(file_content) or _detect_mime_type(file_content)
         
-        is_valid = mime_type in allowed_mime_types
+        is_valid = mime_type in _ALLOWED_MIME_TYPES
         
         if is_valid:
-            logger.info(f"ファイル検証成功: MIME={mime_type}")
+            logger.info("ファイル検証成功: MIME=%s", mime_type)
         else:
-            logger.warning(f"不正なファイル形式を検出: MIME={mime_type}")
+            logger.warning("不正なファイル形式を検出: MIME=%s", mime_type)
         
         return is_valid
         
     except Exception as e:
-        logger.error(f"ファイル検証エラー: {e}")
+        logger.error("ファイル検証エラー: %s", e)
         return False
 
-def process_image(uploaded_file) -> Optional[Tuple[Image.Image, str]]:
+def process_image(uploaded_file, max_dimension: Optional[int] = None) -> Optional[Tuple[Image.Image, str]]:
     """
     アップロードされた画像ファイルを処理
     
     Args:
         uploaded_file: Streamlitのアップロードファイルオブジェクト
+        max_dimension: 最大幅・高さ（ピクセル）。超える画像は縦横比を保って縮小する
         
     Returns:
         tuple: (PIL Image オブジェクト, 画像の説明テキスト) または None
+        （縮小しない場合、画像はヘッダーのみ読み込んだ状態で返し、画素は使用時にデコードされる）
     """
     try:
-        # 画像を開く
+        # 画像を開く（ヘッダーのみ読み込み、画素データはデコードしない）
         image = Image.open(uploaded_file)
         
         # 画像情報を取得
-        description = f"画像ファイル: {uploaded_file.name}\n"
-        description += f"サイズ: {image.size[0]} x {image.size[1]} ピクセル\n"
-        description += f"フォーマット: {image.format}\n"
-        description += f"モード: {image.mode}"
+        description_lines = [
+            f"画像ファイル: {uploaded_file.name}",
+            f"サイズ: {image.size[0]} x {image.size[1]} ピクセル",
+            f"フォーマット: {image.format}",
+            f"モード: {image.mode}",
+        ]
         
-        logger.info(f"画像ファイルを処理しました: {uploaded_file.name}")
+        # 大きな画像はLLMへの送信サイズとトークン数を抑えるため縮小
+        if max_dimension and max(image.size) > max_dimension:
+            image.thumbnail((max_dimension, max_dimension), Image.Resampling.LANCZOS)
+            # コピーして元ファイルのフォーマット情報を外す（元のバイト列ではなく縮小後の画像を送信させる）
+            image = image.copy()
+            description_lines.append(f"縮小後のサイズ: {image.size[0]} x {image.size[1]} ピクセル")
+        description = "\n".join(description_lines)
+        
+        logger.info("画像ファイルを処理しました: %s", uploaded_file.name)
         return image, description
         
     except Exception as e:
-        logger.error(f"画像処理エラー: {e}")
+        logger.error("画像処理エラー: %s", e)
         return None
 
+def _append_page_text(text_content: list, page_num: int, page_text: str):
+    """
+    ページ見出しと本文を抽出結果の断片リストに追加（ページごとの文字列を作らず、最後に1回だけ結合する）
+    
+    Args:
+        text_content: 抽出結果の断片リスト
+        page_num: ページ番号（0始まり）
+        page_text: ページのテキスト
+    """
+    if text_content:
+        text_content.append("\n\n")
+    text_content.extend(("--- ページ ", str(page_num + 1), " ---\n", page_text))
+
+def process_pdf_with_pypdfium2(uploaded_file) -> Optional[str]:
+    """
+    pypdfium2（PDFium）を使用してPDFからテキストを抽出
+    
+    Args:
+        uploaded_file: Streamlitのアップロードファイルオブジェクト
+        
+    Returns:
+        str: 抽出されたテキスト または None
+    """
+    try:
+        import pypdfium2 as pdfium
+        
+        # ファイルポインタを先頭に戻す
+        uploaded_file.seek(0)
+        
+        pdf = pdfium.PdfDocument(uploaded_file.read())
+        try:
+            text_content = []
+            
+            for page_num in range(len(pdf)):
+                try:
+                    page = pdf[page_num]
+                    text_page = page.get_textpage()
+                    # PDFiumは改行をCRLFで返すため、他のエンジンと同じLFに揃える
+                    page_text = text_page.get_text_range().replace("\r\n", "\n")
+                    text_page.close()
+                    page.close()
+                    if page_text.strip():
+                        _append_page_text(text_content, page_num, page_text)
+                except Exception as e:
+                    logger.warning("ページ %s の処理でエラー: %s", page_num + 1, e)
+                    continue
+            
+            if text_content:
+                result = "".join(text_content)
+                logger.info("pypdfium2でPDFを処理しました: %s (%sページ)", uploaded_file.name, len(pdf))
+                return result
+            else:
+                logger.warning("PDFからテキストを抽出できませんでした: %s", uploaded_file.name)
+                return None
+        finally:
+            pdf.close()
+            
+    except Exception as e:
+        logger.error("pypdfium2でのPDF処理エラー: %s", e)
+        return None
+
+def _safe_extract_text(page, page_num: int) -> Optional[str]:
+    """
+    ページのテキストを抽出（失敗したページは警告を出してスキップ）
+    
+    Args:
+        page: PyPDF2またはpdfplumberのページオブジェクト
+        page_num: ページ番号（0始まり）
+        
+    Returns:
+        str: 抽出されたテキスト または None
+    """
+    try:
+        return page.extract_text()
+    except Exception as e:
+        logger.warning("ページ %s の処理でエラー: %s", page_num + 1, e)
+        return None
+
+def _extract_pypdf2_pages(pdf_bytes: bytes, start: int, stop: int) -> List[Optional[str]]:
+    """ワーカープロセスでPDFを開き直し、PyPDF2で指定範囲のページのテキストを抽出"""
+    import PyPDF2
+    pages = PyPDF2.PdfReader(io.BytesIO(pdf_bytes)).pages
+    return [_safe_extract_text(pages[page_num], page_num) for page_num in range(start, stop)]
+
+def _extract_pdfplumber_pages(pdf_bytes: bytes, start: int, stop: int) -> List[Optional[str]]:
+    """ワーカープロセスでPDFを開き直し、pdfplumberで指定範囲のページのテキストを抽出"""
+    import pdfplumber
+    with pdfplumber.open(io.BytesIO(pdf_bytes)) as pdf:
+        return [_safe_extract_text(pdf.pages[page_num], page_num) for page_num in range(start, stop)]
+
+@lru_cache(maxsize=1)
+def _get_pdf_executor() -> ProcessPoolExecutor:
+    """
+    ページ並列抽出用のプロセスプールを取得（初回のみ作成し、以降は使い回す）
+    
+    Streamlitのサーバーはマルチスレッドのため、他のスレッドが保持するロックごと
+    プロセスを複製するforkではなく、spawnでワーカープロセスを起動する
+    
+    Returns:
+        ProcessPoolExecutor: 共有のプロセスプール
+    """
+    return ProcessPoolExecutor(max_workers=_PDF_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+
+def _extract_page_texts(pages, uploaded_file,
+                        extract_pages: Callable[[bytes, int, int], List[Optional[str]]]) -> List[Optional[str]]:
+    """
+    全ページのテキストをページ順に抽出
+    
+    ページ数が多い場合はページをワーカー数で連続した範囲に分割し、共有のプロセスプールで
+    範囲ごとにPDFを1回だけ開き直して並列に抽出する（並列処理に失敗した場合は逐次処理する）
+    
+    Args:
+        pages: 開いているPDFのページ一覧
+        uploaded_file: Streamlitのアップロードファイルオブジェクト
+        extract_pages: ワーカープロセスで実行するページ範囲の抽出関数
+        
+    Returns:
+        list: ページごとのテキスト（抽出できなかったページはNone）
+    """
+    page_count = len(pages)
+    workers = min(_PDF_WORKERS, page_count)
+    if page_count >= _PARALLEL_PDF_MIN_PAGES and workers > 1:
+        try:
+            uploaded_file.seek(0)
+            pdf_bytes = uploaded_file.read()
+            chunk_size = -(-page_count // workers)
+            starts = range(0, page_count, chunk_size)
+            stops = [min(start + chunk_size, page_count) for start in starts]
+            chunks = _get_pdf_executor().map(extract_pages, repeat(pdf_bytes), starts, stops)
+            return [text for chunk in chunks for text in chunk]
+        except Exception as e:
+            # ワーカーが異常終了したプールは再利用できないため、次回は作り直す
+            if isinstance(e, BrokenProcessPool):
+                _get_pdf_executor.cache_clear()
+            logger.warning("PDFの並列処理に失敗したため逐次処理します: %s", e)
+    
+    return [_safe_extract_text(page, page_num) for page_num, page in enumerate(pages)]
+
 def process_pdf_with_pypdf2(uploaded_file) -> Optional[str]:
     """
     PyPDF2を使用してPDFからテキストを抽出
@@ -137,31 +420,29 @@ def process_pdf_with_pypdf2(uploaded_file) -> Optional[str]:
         str: 抽出されたテキスト または None
     """
     try:
+        import PyPDF2
+        
         # ファイルポインタを先頭に戻す
         uploaded_file.seek(0)
         
         pdf_reader = PyPDF2.PdfReader(uploaded_file)
         text_content = []
         
-        for page_num, page in enumerate(pdf_reader.pages):
-            try:
-                page_text = page.extract_text()
-                if page_text.strip():
-                    text_content.append(f"--- ページ {page_num + 1} ---\n{page_text}")
-            except Exception as e:
-                logger.warning(f"ページ {page_num + 1} の処理でエラー: {e}")
-                continue
+        page_texts = _extract_page_texts(pdf_reader.pages, uploaded_file, _extract_pypdf2_pages)
+        for page_num, page_text in enumerate(page_texts):
+            if page_text and page_text.strip():
+                _append_page_text(text_content, page_num, page_text)
         
         if text_content:
-            result = "\n\n".join(text_content)
-            logger.info(f"PyPDF2でPDFを処理しました: {uploaded_file.name} ({len(pdf_reader.pages)}ページ)")
+            result = "".join(text_content)
+            logger.info("PyPDF2でPDFを処理しました: %s (%sページ)", uploaded_file.name, len(pdf_reader.pages))
             return result
         else:
-            logger.warning(f"PDFからテキストを抽出できませんでした: {uploaded_file.name}")
+            logger.warning("PDFからテキストを抽出できませんでした: %s", uploaded_file.name)
             return None
             
     except Exception as e:
-        logger.error(f"PyPDF2でのPDF処理エラー: {e}")
+        logger.error("PyPDF2でのPDF処理エラー: %s", e)
         return None
 
 def process_pdf_with_pdfplumber(uploaded_file) -> Optional[str]:
@@ -175,31 +456,29 @@ def process_pdf_with_pdfplumber(uploaded_file) -> Optional[str]:
         str: 抽出されたテキスト または None
     """
     try:
+        import pdfplumber
+        
         # ファイルポインタを先頭に戻す
         uploaded_file.seek(0)
         
         with pdfplumber.open(uploaded_file) as pdf:
             text_content = []
             
-            for page_num, page in enumerate(pdf.pages):
-                try:
-                    page_text = page.extract_text()
-                    if page_text and page_text.strip():
-                        text_content.append(f"--- ページ {page_num + 1} ---\n{page_text}")
-                except Exception as e:
-                    logger.warning(f"ページ {page_num + 1} の処理でエラー: {e}")
-                    continue
+            page_texts = _extract_page_texts(pdf.pages, uploaded_file, _extract_pdfplumber_pages)
+            for page_num, page_text in enumerate(page_texts):
+                if page_text and page_text.strip():
+                    _append_page_text(text_content, page_num, page_text)
             
             if text_content:
-                result = "\n\n".join(text_content)
-                logger.info(f"pdfplumberでPDFを処理しました: {uploaded_file.name} ({len(pdf.pages)}ページ)")
+                result = "".join(text_content)
+                logger.info("pdfplumberでPDFを処理しました: %s (%sページ)", uploaded_file.name, len(pdf.pages))
                 return result
             else:
-                logger.warning(f"PDFからテキストを抽出できませんでした: {uploaded_file.name}")
+                logger.warning("PDFからテキストを抽出できませんでした: %s", uploaded_file.name)
                 return None
                 
     except Exception as e:
-        logger.error(f"pdfplumberでのPDF処理エラー: {e}")
+        logger.error("pdfplumberでのPDF処理エラー: %s", e)
         return None
 
 def process_pdf(uploaded_file) -> Optional[str]:
@@ -216,16 +495,21 @@ def process_pdf(uploaded_file) -> Optional[str]:
     try:
         from .config import get_file_upload_config
         file_config = get_file_upload_config()
-        engines = file_config.get("pdf_processing", {}).get("engines", ["pdfplumber", "pypdf2"])
+        engines = file_config.get("pdf_processing", {}).get("engines", _DEFAULT_PDF_ENGINES)
     except ImportError:
         # フォールバック: デフォルトの順序
-        engines = ["pdfplumber", "pypdf2"]
+        engines = _DEFAULT_PDF_ENGINES
     
     result = None
     
     # 設定された順序でエンジンを試行
     for engine in engines:
-        if engine.lower() == "pdfplumber":
+        if engine.lower() == "pypdfium2":
+            result = process_pdf_with_pypdfium2(uploaded_file)
+            if result is not None:
+                break
+            logger.info("pypdfium2が失敗、次のエンジンを試します")
+        elif engine.lower() == "pdfplumber":
             result = process_pdf_with_pdfplumber(uploaded_file)
             if result is not None:
                 break
@@ -236,7 +520,7 @@ def process_pdf(uploaded_file) -> Optional[str]:
                 break
             logger.info("PyPDF2が失敗、次のエンジンを試します")
         else:
-            logger.warning(f"未知のPDFエンジン: {engine}")
+            logger.warning("未知のPDFエンジン: %s", engine)
     
     return result
 
@@ -254,32 +538,56 @@ def get_file_type(file_name: str, uploaded_file=None) -> str:
     if not file_name:
         return 'unknown'
     
-    # 拡張子による基本判定
-    extension = file_name.lower().split('.')[-1]
+    # 拡張子による判定（小文字化はファイル名全体ではなく拡張子のみに行う）
+    file_type = _EXTENSION_TO_FILE_TYPE.get(file_name.rpartition('.')[2].lower())
     
-    # 拡張子が不正な場合は即座に拒否
-    allowed_extensions = ['jpg', 'jpeg', 'png', 'gif', 'bmp', 'webp', 'pdf']
-    if extension not in allowed_extensions:
+    # 拡張子が不正な場合は内容を検証せずに即座に拒否
+    if file_type is None:
         return 'unknown'
     
     # ファイル内容がある場合は内容検証を実施
     if uploaded_file is not None:
         if not validate_file_content(uploaded_file):
-            logger.warning(f"ファイル内容検証失敗: {file_name}")
+            logger.warning("ファイル内容検証失敗: %s", file_name)
             return 'unknown'
     
-    # 拡張子による分類
-    if extension in ['jpg', 'jpeg', 'png', 'gif', 'bmp', 'webp']:
-        return 'image'
-    elif extension == 'pdf':
-        return 'pdf'
-    else:
-        return 'unknown'
+    return file_type
+
+class _Base64Writer(io.RawIOBase):
+    """書き込まれたバイト列を逐次base64エンコードして蓄積するファイルライクオブジェクト"""
+    
+    def __init__(self):
+        super().__init__()
+        self._pending = bytearray()  # 3バイト単位に満たない未エンコードの端数
+        self._encoded = bytearray()
+    
+    def writable(self) -> bool:
+        return True
+    
+    def write(self, data) -> int:
+        self._pending += data
+        # base64は3バイト単位でエンコードするため、端数は次の書き込みまで保持する
+        usable = len(self._pending) - len(self._pending) % 3
+        if usable:
+            self._encoded += base64.b64encode(self._pending[:usable])
+            del self._pending[:usable]
+        return len(data)
+    
+    def getvalue(self) -> str:
+        """端数を含めたbase64文字列を取得"""
+        # 端数はバッファに直接追記し、エンコード済みデータ全体の複製を作らずに1回だけデコードする
+        if self._pending:
+            self._encoded += base64.b64encode(self._pending)
+            self._pending.clear()
+        return self._encoded.decode('ascii')
 
 def encode_image_to_base64(image: Image.Image, format: str = "PNG") -> str:
     """
     PIL Imageをbase64エンコード
     
+    シークせずに保存できるフォーマットは保存処理の出力を逐次エンコードし、
+    エンコード前の画像データ全体をメモリに保持しない
+    
     Args:
         image: PIL Imageオブジェクト
         format: 画像フォーマット (PNG, JPEG等)
@@ -287,11 +595,51 @@ def encode_image_to_base64(image: Image.Image, format: str = "PNG") -> str:
     Returns:
         str: base64エンコードされた画像データ
     """
+    if format.upper() not in _STREAMING_SAVE_FORMATS:
+        buffer = io.BytesIO()
+        image.save(buffer, format=format)
+        return base64.b64encode(buffer.getvalue()).decode('ascii')
+    
+    writer = _Base64Writer()
+    if format.upper() == "PNG":
+        image.save(writer, format=format, compress_level=_PNG_SEND_COMPRESS_LEVEL)
+    else:
+        image.save(writer, format=format)
+    return writer.getvalue()
+
+def encode_bytes_to_base64(data: bytes) -> str:
+    """
+    画像ファイルのバイト列をそのままbase64エンコード（PILでの再エンコードを行わない）
+    
+    Args:
+        data: 画像ファイルのバイト列
+        
+    Returns:
+        str: base64エンコードされた画像データ
+    """
+    return base64.b64encode(data).decode('ascii')
+
+def encode_image_for_upload(image: Image.Image, quality: int = 85) -> Tuple[bytes, str]:
+    """
+    PIL ImageをLLM送信用のバイト列にエンコード
+    透過情報がある画像はPNG、それ以外はサイズの小さいJPEGで保存する
+    
+    Args:
+        image: PIL Imageオブジェクト
+        quality: JPEGの画質 (1-95)
+        
+    Returns:
+        tuple: (エンコードされた画像データ, MIMEタイプ)
+    """
     buffer = io.BytesIO()
-    image.save(buffer, format=format)
-    buffer.seek(0)
-    encoded = base64.b64encode(buffer.read()).decode('utf-8')
-    return encoded
+    if image.mode in ("RGBA", "LA", "PA") or "transparency" in image.info:
+        image.save(buffer, format="PNG", compress_level=_PNG_SEND_COMPRESS_LEVEL)
+        return buffer.getvalue(), _FORMAT_TO_MIME["PNG"]
+    
+    if image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+    image.save(buffer, format="JPEG", quality=quality, optimize=True)
+    return buffer.getvalue(), _FORMAT_TO_MIME["JPEG"]
 
 def get_image_mime_type(format: str) -> str:
     """
@@ -303,15 +651,7 @@ def get_image_mime_type(format: str) -> str:
     Returns:
         str: MIMEタイプ
     """
-    format_to_mime = {
-        'PNG': 'image/png',
-        'JPEG': 'image/jpeg',
-        'JPG': 'image/jpeg',
-        'GIF': 'image/gif',
-        'BMP': 'image/bmp',
-        'WEBP': 'image/webp'
-    }
-    return format_to_mime.get(format.upper(), 'image/png')
+    return _FORMAT_TO_MIME.get(format.upper(), 'image/png')
 
 def format_file_content_for_ai(file_type: str, content: Union[str, Image.Image], file_name: str) -> str:
     """
@@ -4,7 +4,7 @@ Streamlitアプリケーションとデータベースの橋渡しを行う
 """
 
 import uuid
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 from PIL import Image
 import logging
 
@@ -12,6 +12,12 @@ from .database import ChatHistoryDatabase
 
 logger = logging.getLogger(__name__)
 
+# エクスポート時の役割の表示名（ユーザーかどうかで引く）と画像ありの注記
+_TEXT_ROLE_LABELS = ("アシスタント", "ユーザー")
+_MARKDOWN_ROLE_LABELS = ("🤖 アシスタント", "👤 ユーザー")
+_TEXT_IMAGE_NOTE = "\n  (画像あり)"
+_MARKDOWN_IMAGE_NOTE = "*📷 画像あり*\n"
+
 class ChatHistoryManager:
     """チャット履歴管理クラス"""
     
@@ -37,7 +43,7 @@ class ChatHistoryManager:
         """
         session_id = str(uuid.uuid4())
         self._current_session_id = session_id
-        logger.info(f"新しいセッション開始: {session_id}, model: {model_name}")
+        logger.info("新しいセッション開始: %s, model: %s", session_id, model_name)
         return session_id
     
     def set_current_session(self, session_id: str):
@@ -48,7 +54,7 @@ class ChatHistoryManager:
             session_id: セッションID
         """
         self._current_session_id = session_id
-        logger.debug(f"現在のセッション設定: {session_id}")
+        logger.debug("現在のセッション設定: %s", session_id)
     
     def get_current_session_id(self) -> Optional[str]:
         """
@@ -60,7 +66,8 @@ class ChatHistoryManager:
         return self._current_session_id
     
     def save_user_message(self, content: str, image: Optional[Image.Image] = None, 
-                         model_name: str = None) -> int:
+                         model_name: str = None, session_id: Optional[str] = None,
+                         image_bytes: Optional[bytes] = None) -> int:
         """
         ユーザーメッセージを保存
         
@@ -68,37 +75,45 @@ class ChatHistoryManager:
             content: メッセージ内容
             image: 画像データ（オプション）
             model_name: 使用モデル名
+            session_id: 保存先のセッションID（省略時は現在のセッション）
+            image_bytes: 画像の元ファイルのバイト列（オプション）
             
         Returns:
             メッセージID
         """
-        if not self._current_session_id:
-            self.start_new_session(model_name)
+        if session_id is None:
+            if not self._current_session_id:
+                self.start_new_session(model_name)
+            session_id = self._current_session_id
         
         return self.db.save_message(
-            session_id=self._current_session_id,
+            session_id=session_id,
             role="user",
             content=content,
             image=image,
-            model_name=model_name
+            model_name=model_name,
+            image_bytes=image_bytes
         )
     
-    def save_assistant_message(self, content: str) -> int:
+    def save_assistant_message(self, content: str, session_id: Optional[str] = None) -> int:
         """
         アシスタントメッセージを保存
         
         Args:
             content: メッセージ内容
+            session_id: 保存先のセッションID（省略時は現在のセッション）
             
         Returns:
             メッセージID
         """
-        if not self._current_session_id:
-            logger.warning("セッションが設定されていません。新しいセッションを開始します。")
-            self.start_new_session()
+        if session_id is None:
+            if not self._current_session_id:
+                logger.warning("セッションが設定されていません。新しいセッションを開始します。")
+                self.start_new_session()
+            session_id = self._current_session_id
         
         return self.db.save_message(
-            session_id=self._current_session_id,
+            session_id=session_id,
             role="assistant",
             content=content
         )
@@ -137,7 +152,7 @@ class ChatHistoryManager:
             
             streamlit_messages.append(streamlit_msg)
         
-        logger.debug(f"セッションメッセージ読み込み: session_id={session_id}, count={len(streamlit_messages)}")
+        logger.debug("セッションメッセージ読み込み: session_id=%s, count=%s", session_id, len(streamlit_messages))
         return streamlit_messages
     
     def search_messages(self, query: str, limit: int = 50) -> List[Dict[str, Any]]:
@@ -153,17 +168,18 @@ class ChatHistoryManager:
         """
         return self.db.search_messages(query, limit)
     
-    def get_conversation_list(self, limit: int = 100) -> List[Dict[str, Any]]:
+    def get_conversation_list(self, limit: int = 100, cursor: Optional[Tuple[str, str]] = None) -> List[Dict[str, Any]]:
         """
         会話一覧を取得
         
         Args:
             limit: 取得数の上限
+            cursor: 前のページ最後の会話の (updated_at, session_id)。指定時はその続きから取得
             
         Returns:
             会話一覧
         """
-        return self.db.get_conversations(limit)
+        return self.db.get_conversations(limit, cursor)
     
     def delete_conversation(self, session_id: str) -> bool:
         """
@@ -208,7 +224,8 @@ class ChatHistoryManager:
         Returns:
             エクスポートされたデータ（失敗時はNone）
         """
-        messages = self.db.load_messages(session_id)
+        # エクスポートには画像の有無だけを出力するため、画像データは読み込まない
+        messages = self.db.load_messages(session_id, include_images=False)
         if not messages:
             return None
         
@@ -217,29 +234,23 @@ class ChatHistoryManager:
             return json.dumps(messages, ensure_ascii=False, indent=2, default=str)
         
         elif format == "text":
-            lines = []
-            for msg in messages:
-                timestamp = msg.get("timestamp", "")
-                role = "ユーザー" if msg["role"] == "user" else "アシスタント"
-                lines.append(f"[{timestamp}] {role}: {msg['content']}")
-                if "image" in msg:
-                    lines.append("  (画像あり)")
-            return "\n".join(lines)
+            # メッセージごとに1つの文字列を作り、最後に1回だけ結合する
+            return "\n".join([
+                f"[{msg['timestamp']}] {_TEXT_ROLE_LABELS[msg['role'] == 'user']}: {msg['content']}"
+                f"{_TEXT_IMAGE_NOTE if msg['has_image'] else ''}"
+                for msg in messages
+            ])
         
         elif format == "markdown":
-            lines = []
-            for msg in messages:
-                timestamp = msg.get("timestamp", "")
-                role = "👤 ユーザー" if msg["role"] == "user" else "🤖 アシスタント"
-                lines.append(f"## {role} ({timestamp})")
-                lines.append(msg['content'])
-                if "image" in msg:
-                    lines.append("*📷 画像あり*")
-                lines.append("")
-            return "\n".join(lines)
+            # メッセージごとのブロックは末尾が改行のため、空行を挟んで結合される
+            return "\n".join([
+                f"## {_MARKDOWN_ROLE_LABELS[msg['role'] == 'user']} ({msg['timestamp']})\n{msg['content']}\n"
+                f"{_MARKDOWN_IMAGE_NOTE if msg['has_image'] else ''}"
+                for msg in messages
+            ])
         
         else:
-            logger.error(f"サポートされていないエクスポート形式: {format}")
+            logger.error("サポートされていないエクスポート形式: %s", format)
             return None
     
     def get_statistics(self) -> Dict[str, Any]:
@@ -277,18 +288,8 @@ class ChatHistoryManager:
         
         session_id = self.start_new_session(model_name)
         
-        for msg in session_state_messages:
-            role = msg["role"]
-            content = msg["content"]
-            image = msg.get("image")
-            
-            self.db.save_message(
-                session_id=session_id,
-                role=role,
-                content=content,
-                image=image,
-                model_name=model_name if role == "user" else None
-            )
+        # メッセージごとにコミットせず、1つのトランザクションでまとめて保存
+        self.db.save_messages_bulk(session_id, session_state_messages, model_name)
         
-        logger.info(f"セッション状態を移行: {len(session_state_messages)}メッセージ -> {session_id}")
+        logger.info("セッション状態を移行: %sメッセージ -> %s", len(session_state_messages), session_id)
         return session_id
\ No newline at end of file
@@ -0,0 +1,112 @@
+"""
+LangChainメッセージ履歴の管理ユーティリティ
+セッション状態のメッセージをLangChain形式に変換した結果を保持し、差分だけを変換する
+"""
+from typing import Any, Callable, Dict, List, Optional
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
+
+from src.models.config import ModelConfig
+
+SYSTEM_PROMPT = "あなたは親切で有用なAIアシスタントです。日本語で丁寧に回答してください。"
+# システムプロンプトはユーザー発言ではなくシステムメッセージとして送信し、インスタンスは全会話で共有する
+SYSTEM_MESSAGE = SystemMessage(content=SYSTEM_PROMPT)
+
+# メッセージ1件をLangChainメッセージに変換する関数（メッセージ, 画像を添付するか, Files APIで送信するモデル名）
+MessageConverter = Callable[[Dict[str, Any], bool, Optional[str]], BaseMessage]
+
+def has_uploaded_image(msg: Dict[str, Any], model_name: Optional[str]) -> bool:
+    """
+    メッセージの画像がFiles APIにアップロード済みで、ファイルIDで参照できるか
+    
+    Args:
+        msg: セッションのメッセージ
+        model_name: 画像をFiles APIで送信する場合のモデル名（送信しない場合はNone）
+    
+    Returns:
+        bool: アップロード済みのファイルIDがある場合True
+    """
+    if model_name is None:
+        return False
+    provider = ModelConfig.MODELS[model_name]["provider"]
+    return bool(msg.get("_file_ids", {}).get(provider))
+
+def reset_langchain_messages(state) -> None:
+    """
+    変換済みLangChainメッセージ履歴をリセット（会話の切り替え・クリア時に呼ぶ）
+    
+    Args:
+        state: セッション状態（st.session_state）
+    """
+    state.langchain_messages = [SYSTEM_MESSAGE]
+    state.langchain_format = None
+
+def sync_langchain_messages(state, supports_vision: bool, file_api_model: Optional[str],
+                            convert: MessageConverter) -> List[BaseMessage]:
+    """
+    state.messagesのうち未変換の分だけをLangChain形式に変換して追記
+    
+    変換済みのメッセージはstate.langchain_messagesの2件目以降にstate.messagesと同じ順で保持する。
+    base64で送信する画像は最新のメッセージにのみ添付し、過去のターンは
+    メッセージ本文に含まれる画像の説明テキストのみを送信する
+    （ファイルIDで参照できる画像は送信量が小さいため、メッセージごとに判定して過去の画像も残す）
+    
+    Args:
+        state: セッション状態（st.session_state）
+        supports_vision: 選択中のモデルが画像に対応しているか
+        file_api_model: 画像をFiles APIで送信する場合のモデル名
+        convert: メッセージ1件をLangChainメッセージに変換する関数
+    
+    Returns:
+        list: システムメッセージを先頭に含むLangChainメッセージのリスト
+    """
+    # 画像対応の有無や送信方法が変わった場合は画像の扱いが変わるため作り直す
+    message_format = (supports_vision, file_api_model)
+    if state.langchain_format != message_format:
+        reset_langchain_messages(state)
+        state.langchain_format = message_format
+    
+    langchain_messages = state.langchain_messages
+    converted = len(langchain_messages) - 1  # システムメッセージ分を除く
+    new_messages = state.messages[converted:]
+    if not new_messages:
+        return langchain_messages
+    
+    last_message = langchain_messages[-1]
+    if isinstance(last_message.content, list) and any(
+        part.get("type") == "image_url" for part in last_message.content
+    ):
+        # これまで最新だったメッセージのbase64画像を外し、テキストのみにする
+        # （アップロードに失敗してbase64で送信した画像も、以降のターンでは再送しない）
+        langchain_messages[-1] = HumanMessage(content=last_message.text)
+    
+    latest = new_messages[-1]
+    langchain_messages.extend(
+        convert(
+            msg,
+            supports_vision and (msg is latest or has_uploaded_image(msg, file_api_model)),
+            file_api_model
+        )
+        for msg in new_messages
+    )
+    return langchain_messages
+
+def apply_history_window(langchain_messages: List[BaseMessage], window: int) -> List[BaseMessage]:
+    """
+    システムメッセージを残したまま直近のwindow件だけに履歴を切り詰める
+    
+    Args:
+        langchain_messages: システムメッセージを先頭に含むLangChainメッセージのリスト
+        window: 送信する直近メッセージ数（0以下の場合は切り詰めない）
+        
+    Returns:
+        list: モデルに送信するメッセージのリスト
+    """
+    history = langchain_messages[1:]
+    if window <= 0 or len(history) <= window:
+        return langchain_messages
+    
+    recent = history[-window:]
+    # 会話がアシスタントの応答から始まらないようにする
+    if isinstance(recent[0], AIMessage):
+        recent = recent[1:]
+    return [langchain_messages[0], *recent]
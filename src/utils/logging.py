@@ -24,14 +24,13 @@ def setup_logging(
     if format_string is None:
         format_string = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
     
-    # ルートロガーの設定
-    logging.basicConfig(
-        level=getattr(logging, level.upper()),
-        format=format_string,
-        handlers=[
-            logging.StreamHandler(sys.stdout)
-        ]
-    )
+    # ルートロガーの設定（再実行時にハンドラーが重複しないよう、未設定の場合のみ追加）
+    root_logger = logging.getLogger()
+    root_logger.setLevel(getattr(logging, level.upper()))
+    if not root_logger.handlers:
+        handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(logging.Formatter(format_string))
+        root_logger.addHandler(handler)
     
     # 指定されたロガーを取得
     logger = logging.getLogger(logger_name)
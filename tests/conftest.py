@@ -4,6 +4,47 @@ pytest設定とフィクスチャ
 import pytest
 import os
 from unittest.mock import patch
+from PIL import Image
+
+from src.models import get_available_models
+from src.models.factory import _get_anthropic_client
+from src.utils.database import ChatHistoryDatabase, MEMORY_DB_PATH
+from src.utils.file_processing import _detect_mime_type, _sanitize_cached, sanitize_user_input
+
+
+@pytest.fixture(scope="session", autouse=True)
+def warm_up_libraries():
+    """bleachのCleaner構築とPILのプラグイン登録を最初に一度だけ済ませ、最初に実行されるテストの時間に含めない"""
+    sanitize_user_input("<b>warm</b>")
+    Image.init()
+
+
+# 環境変数やモックの内容に結果が依存するため、テストごとにクリアするキャッシュ付き関数
+# （モデル可用性・Anthropicクライアント・MIMEタイプ判定・サニタイズ結果）
+_CACHED_FUNCTIONS = (
+    get_available_models,
+    _get_anthropic_client,
+    _detect_mime_type,
+    _sanitize_cached,
+)
+
+
+@pytest.fixture(autouse=True)
+def clear_function_caches():
+    """キャッシュ付き関数の結果がテスト間で持ち越されないよう、各テストの前後でクリア"""
+    for cached_function in _CACHED_FUNCTIONS:
+        cached_function.cache_clear()
+    yield
+    for cached_function in _CACHED_FUNCTIONS:
+        cached_function.cache_clear()
+
+
+@pytest.fixture(scope="session")
+def memory_history_db():
+    """テスト全体で共有するメモリ上の履歴データベース（スキーマの作成は1回のみ）"""
+    db = ChatHistoryDatabase(MEMORY_DB_PATH)
+    yield db
+    db.close()
 
 
 @pytest.fixture
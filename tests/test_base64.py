@@ -0,0 +1,121 @@
+"""
+base64エンコード機能のテスト
+"""
+import pytest
+import io
+import base64
+import random
+import tracemalloc
+from types import SimpleNamespace
+from PIL import Image
+from src.utils.file_processing import (
+    encode_image_to_base64,
+    encode_image_for_upload,
+    encode_bytes_to_base64,
+    get_image_mime_type,
+)
+
+# base64エンコードのテストで使うバイト列と、その期待値（インポート時に一度だけ計算）
+_PAYLOAD = b'fake_image_data'
+_EXPECTED_B64 = base64.b64encode(_PAYLOAD).decode()
+
+# 画像フォーマットと期待するMIMEタイプ
+_MIME_TYPE_CASES = (
+    ("PNG", "image/png"),
+    ("JPEG", "image/jpeg"),
+    ("JPG", "image/jpeg"),
+    ("GIF", "image/gif"),
+    ("BMP", "image/bmp"),
+    ("WEBP", "image/webp"),
+    ("jpeg", "image/jpeg"),  # 小文字でも判定できる
+    ("UNKNOWN", "image/png"),  # デフォルト値
+)
+
+# base64の往復で画素が変わらない可逆フォーマット（TIFFは保存時にシークが必要な形式の代表）
+_LOSSLESS_FORMATS = ("PNG", "BMP", "GIF", "TIFF")
+
+# 送信用エンコードの画像モード・追加情報と、期待するMIMEタイプ・保存フォーマット（透過ありはPNG、透過なしはJPEG）
+_UPLOAD_CASES = (
+    ("RGBA", {}, "image/png", "PNG"),
+    ("LA", {}, "image/png", "PNG"),
+    ("P", {"transparency": 0}, "image/png", "PNG"),
+    ("RGB", {}, "image/jpeg", "JPEG"),
+    ("L", {}, "image/jpeg", "JPEG"),
+    ("CMYK", {}, "image/jpeg", "JPEG"),
+)
+
+class TestBase64Encoding:
+    """base64エンコード機能のテスト"""
+    
+    def test_encode_image_to_base64(self):
+        """画像のbase64エンコードテスト"""
+        save_options = []
+        
+        def save(fp, **options):
+            # 保存処理が複数回に分けて書き込む場合も正しくエンコードされること
+            save_options.append(options)
+            fp.write(_PAYLOAD[:5])
+            fp.write(_PAYLOAD[5:])
+        
+        result = encode_image_to_base64(SimpleNamespace(save=save), "PNG")
+        
+        # base64エンコードされた結果を確認
+        assert result == _EXPECTED_B64
+        # 送信用のPNGは速度を優先した低い圧縮レベルで保存する
+        assert save_options == [{"format": "PNG", "compress_level": 1}]
+    
+    @pytest.mark.parametrize("image_format", _LOSSLESS_FORMATS)
+    def test_encode_image_to_base64_roundtrip(self, image_format):
+        """実画像のbase64エンコード結果を復元すると元の画像と一致することのテスト"""
+        image = Image.new("RGB", (64, 64), color="blue")
+        
+        decoded = Image.open(io.BytesIO(base64.b64decode(encode_image_to_base64(image, image_format))))
+        
+        assert decoded.format == image_format
+        assert decoded.convert("RGB").tobytes() == image.tobytes()
+    
+    def test_encode_image_to_base64_peak_memory(self):
+        """逐次エンコードのピークメモリがBytesIOに保存してからエンコードする場合より小さいことのテスト"""
+        # 圧縮が効かないノイズ画像で、エンコード後のデータを大きくする
+        image = Image.frombytes("RGB", (512, 512), random.Random(0).randbytes(512 * 512 * 3))
+        
+        def encode_via_bytesio():
+            buffer = io.BytesIO()
+            image.save(buffer, format="PNG", compress_level=1)
+            return base64.b64encode(buffer.getvalue()).decode("ascii")
+        
+        def peak_memory(encode):
+            encode()  # 初回のみの確保（プラグインの読み込み等）を計測に含めない
+            tracemalloc.start()
+            try:
+                result = encode()
+                return tracemalloc.get_traced_memory()[1], result
+            finally:
+                tracemalloc.stop()
+        
+        streaming_peak, streaming_result = peak_memory(lambda: encode_image_to_base64(image, "PNG"))
+        bytesio_peak, bytesio_result = peak_memory(encode_via_bytesio)
+        
+        assert streaming_result == bytesio_result
+        assert streaming_peak < bytesio_peak
+    
+    @pytest.mark.parametrize("mode,info,expected_mime,expected_format", _UPLOAD_CASES)
+    def test_encode_image_for_upload(self, mode, info, expected_mime, expected_format):
+        """送信用エンコードのテスト（透過なしはJPEG、透過ありはPNG）"""
+        image = Image.new(mode, (10, 10))
+        image.info.update(info)
+        
+        data, mime_type = encode_image_for_upload(image)
+        
+        assert mime_type == expected_mime
+        assert Image.open(io.BytesIO(data)).format == expected_format
+    
+    def test_encode_bytes_to_base64(self):
+        """元のバイト列のbase64エンコードテスト（PILを経由しない）"""
+        result = encode_bytes_to_base64(_PAYLOAD)
+        assert result == _EXPECTED_B64
+    
+    @pytest.mark.parametrize("image_format,expected", _MIME_TYPE_CASES)
+    def test_get_image_mime_type(self, image_format, expected):
+        """MIMEタイプ取得のテスト"""
+        assert get_image_mime_type(image_format) == expected
@@ -0,0 +1,59 @@
+"""
+ファイル種類判定のテスト
+"""
+import pytest
+from unittest.mock import Mock
+from src.utils.file_processing import get_file_type
+
+class TestGetFileType:
+    """ファイル種類判定のテスト"""
+    
+    @pytest.mark.parametrize("file_name,expected", [
+        # 画像ファイル
+        ("test.jpg", "image"),
+        ("test.jpeg", "image"),
+        ("test.png", "image"),
+        ("test.gif", "image"),
+        ("test.bmp", "image"),
+        ("test.webp", "image"),
+        ("my.photo.PNG", "image"),  # 拡張子は最後のドット以降・大文字小文字を区別しない
+        # PDFファイル
+        ("test.pdf", "pdf"),
+        ("document.PDF", "pdf"),  # 大文字小文字混在
+        # 未対応ファイル
+        ("test.txt", "unknown"),
+        ("test.docx", "unknown"),
+        ("test.svg", "unknown"),  # SVGは未対応
+        ("", "unknown"),
+        (None, "unknown"),
+    ], ids=repr)
+    def test_file_type_by_extension(self, file_name, expected):
+        """拡張子によるファイル種類判定のテスト"""
+        assert get_file_type(file_name) == expected
+    
+    def test_file_type_with_validation_success(self, monkeypatch):
+        """ファイル内容検証成功のテスト"""
+        mock_file = Mock()
+        mock_validate = Mock(return_value=True)
+        monkeypatch.setattr('src.utils.file_processing.validate_file_content', mock_validate)
+        
+        result = get_file_type("test.jpg", mock_file)
+        
+        assert result == "image"
+        mock_validate.assert_called_once_with(mock_file)
+    
+    def test_file_type_with_validation_failure(self, monkeypatch):
+        """ファイル内容検証失敗のテスト"""
+        mock_file = Mock()
+        mock_validate = Mock(return_value=False)
+        monkeypatch.setattr('src.utils.file_processing.validate_file_content', mock_validate)
+        
+        result = get_file_type("test.jpg", mock_file)
+        
+        assert result == "unknown"
+        mock_validate.assert_called_once_with(mock_file)
+    
+    def test_file_type_without_validation(self):
+        """ファイル内容検証なしのテスト（後方互換性）"""
+        result = get_file_type("test.jpg")
+        assert result == "image"
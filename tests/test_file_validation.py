@@ -0,0 +1,120 @@
+"""
+ファイル内容検証のテスト
+"""
+import pytest
+import io
+from unittest.mock import Mock, call
+from PIL import Image
+from src.utils.file_processing import validate_file_content
+
+# libmagicが返すMIMEタイプと、検証結果の期待値
+_MIME_VALIDATION_CASES = (
+    ("image/png", True),
+    ("image/jpeg", True),
+    ("image/gif", True),
+    ("image/bmp", True),
+    ("image/webp", True),
+    ("application/pdf", True),
+    ("application/x-executable", False),  # 悪意あるファイル
+    ("text/plain", False),
+)
+
+@pytest.fixture
+def mock_magic(monkeypatch):
+    """libmagicをモックに差し替える"""
+    magic = Mock()
+    monkeypatch.setattr('src.utils.file_processing._MAGIC', magic)
+    return magic
+
+@pytest.fixture
+def mock_file():
+    """シグネチャに一致しない先頭バイト列を返すアップロードファイルのモック"""
+    uploaded = Mock(spec=['seek', 'read'])
+    uploaded.read.return_value = b'fake_data'
+    return uploaded
+
+class TestFileValidation:
+    """ファイル内容検証のテスト"""
+    
+    @pytest.mark.parametrize("mime_type,expected", _MIME_VALIDATION_CASES)
+    def test_validate_file_content_mime_type(self, mock_magic, mock_file, mime_type, expected):
+        """libmagicの判定結果に応じた検証テスト"""
+        mock_magic.from_buffer.return_value = mime_type
+        
+        result = validate_file_content(mock_file)
+        
+        assert result is expected
+        mock_file.seek.assert_called_with(0)
+        mock_file.read.assert_called_once_with(32)
+        mock_magic.from_buffer.assert_called_once_with(b'fake_data')
+    
+    def test_validate_file_content_exception_handling(self, mock_magic, mock_file):
+        """例外発生時のテスト"""
+        mock_file.read.side_effect = Exception("File read error")
+        
+        result = validate_file_content(mock_file)
+        
+        assert result is False
+        mock_file.seek.assert_called_with(0)
+    
+    def test_validate_file_content_magic_exception(self, mock_magic, mock_file):
+        """magic処理例外のテスト"""
+        mock_magic.from_buffer.side_effect = Exception("Magic processing error")
+        
+        result = validate_file_content(mock_file)
+        
+        assert result is False
+        mock_file.seek.assert_called_with(0)
+    
+    def test_validate_file_content_file_pointer_reset(self, mock_magic, mock_file):
+        """ファイルポインタリセット確認テスト"""
+        mock_magic.from_buffer.return_value = 'image/jpeg'
+        
+        validate_file_content(mock_file)
+        
+        # ファイルポインタが2回先頭に戻されることを確認
+        assert mock_file.seek.call_count == 2
+        mock_file.seek.assert_has_calls([call(0), call(0)])
+    
+    def test_validate_file_content_signature_fast_path(self, mock_magic):
+        """主要な形式はシグネチャで判定し、libmagicを呼ばないことのテスト"""
+        signatures = [
+            b'\x89PNG\r\n\x1a\n' + b'\x00' * 8,
+            b'\xff\xd8\xff\xe0' + b'\x00' * 8,
+            b'GIF89a' + b'\x00' * 8,
+            b'RIFF\x00\x00\x00\x00WEBPVP8 ',
+            b'%PDF-1.7\n',
+            b'BM' + b'\x00' * 12 + b'\x28\x00\x00\x00',
+        ]
+        
+        for header in signatures:
+            mock_file = Mock()
+            mock_file.read.return_value = header
+            assert validate_file_content(mock_file) is True, f"Failed for header: {header!r}"
+        
+        mock_magic.from_buffer.assert_not_called()
+    
+    @pytest.mark.parametrize("image_format", ["PNG", "JPEG", "GIF", "BMP", "WEBP"])
+    def test_validate_real_image_header(self, mock_magic, image_format):
+        """実際の画像ファイルを先頭バイトのシグネチャだけで判定できることのテスト"""
+        buffer = io.BytesIO()
+        Image.new('RGB', (4, 4)).save(buffer, format=image_format)
+        buffer.seek(0)
+        
+        assert validate_file_content(buffer) is True
+        assert buffer.tell() == 0
+        mock_magic.from_buffer.assert_not_called()
+    
+    def test_validate_text_starting_with_bm(self):
+        """「BM」で始まるだけのテキストはBMPと判定しないことのテスト（libmagicはモックしない）"""
+        buffer = io.BytesIO(b"BMW owners manual\n" * 4)
+        
+        assert validate_file_content(buffer) is False
+    
+    def test_validate_file_content_cached(self, mock_magic, mock_file):
+        """同じ内容の再検証ではlibmagicを呼ばないことのテスト"""
+        mock_magic.from_buffer.return_value = 'image/png'
+        
+        assert validate_file_content(mock_file) is True
+        assert validate_file_content(mock_file) is True
+        mock_magic.from_buffer.assert_called_once_with(b'fake_data')
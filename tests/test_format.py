@@ -0,0 +1,28 @@
+"""
+AIモデル向けフォーマット機能のテスト
+"""
+from types import SimpleNamespace
+from src.utils.file_processing import format_file_content_for_ai
+
+class TestFormatFileContentForAi:
+    """AIモデル向けフォーマット機能のテスト"""
+    
+    def test_format_pdf_content(self):
+        """PDF内容のフォーマットテスト"""
+        result = format_file_content_for_ai("pdf", "PDF text content", "document.pdf")
+        
+        assert "PDFファイル「document.pdf」の内容:" in result
+        assert "PDF text content" in result
+    
+    def test_format_image_content(self):
+        """画像内容のフォーマットテスト"""
+        result = format_file_content_for_ai("image", SimpleNamespace(), "photo.jpg")
+        
+        assert "画像ファイル「photo.jpg」がアップロードされました" in result
+        assert "この画像について質問してください" in result
+    
+    def test_format_unknown_content(self):
+        """未知のファイル形式のフォーマットテスト"""
+        result = format_file_content_for_ai("unknown", "some content", "file.xyz")
+        
+        assert "不明なファイル形式: file.xyz" in result
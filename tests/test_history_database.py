@@ -3,52 +3,64 @@
 """
 
 import pytest
-import tempfile
-import os
+import re
+import base64
+import sqlite3
 from pathlib import Path
 from PIL import Image
 import io
+from concurrent.futures import ThreadPoolExecutor
 
-from src.utils.database import ChatHistoryDatabase
+from src.utils.database import ChatHistoryDatabase, MEMORY_DB_PATH, _FETCH_BATCH_SIZE
 
 @pytest.fixture
-def temp_db():
-    """テスト用の一時データベース"""
-    with tempfile.NamedTemporaryFile(suffix=".db", delete=False) as f:
-        db_path = f.name
-    
-    db = ChatHistoryDatabase(db_path)
-    yield db
-    
-    # クリーンアップ
-    if os.path.exists(db_path):
-        os.unlink(db_path)
+def temp_db(memory_history_db):
+    """テスト用のメモリ上のデータベース（共有のデータベースをテストごとに空にして使い回す）"""
+    yield memory_history_db
+    memory_history_db.clear_all_history()
 
 @pytest.fixture
+def file_db(tmp_path):
+    """ファイルとして作成するテスト用の一時データベース"""
+    db = ChatHistoryDatabase(str(tmp_path / "test.db"))
+    yield db
+    db.close()
+
+@pytest.fixture(scope="module")
 def sample_image():
-    """テスト用のサンプル画像"""
-    image = Image.new('RGB', (100, 100), color='red')
+    """テスト用のサンプル画像（テストでは変更しないためモジュール内で共有）"""
+    image = Image.new('RGB', (16, 16), color='red')
     return image
 
 class TestChatHistoryDatabase:
     """ChatHistoryDatabaseのテストクラス"""
     
-    def test_init_database(self, temp_db):
+    def test_init_database(self, file_db):
         """データベース初期化のテスト"""
-        assert temp_db.db_path.exists()
-        
-        # テーブルが作成されているかチェック
-        import sqlite3
-        with sqlite3.connect(temp_db.db_path) as conn:
-            cursor = conn.cursor()
-            
-            # conversationsテーブル
-            cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='conversations'")
-            assert cursor.fetchone() is not None
-            
-            # messagesテーブル
-            cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='messages'")
-            assert cursor.fetchone() is not None
+        assert file_db.db_path.exists()
+        
+        # テーブルが作成されているかチェック（既存の接続で確認する）
+        assert file_db.table_exists("conversations")
+        assert file_db.table_exists("messages")
+        assert not file_db.table_exists("nonexistent")
+    
+    def test_same_path_returns_same_instance(self, file_db):
+        """同じパスで生成した場合は既存のインスタンスを使い回すテスト"""
+        assert ChatHistoryDatabase(str(file_db.db_path)) is file_db
+        
+        # 閉じた後は新しいインスタンスを作成する
+        file_db.close()
+        reopened = ChatHistoryDatabase(str(file_db.db_path))
+        assert reopened is not file_db
+        reopened.close()
+    
+    def test_memory_database_creates_no_file(self, temp_db):
+        """メモリ上のデータベースはファイルを作成せず、同じパスでは同じインスタンスを使い回すテスト"""
+        temp_db.save_message("memory_session", "user", "メモリ上のメッセージ")
+        assert len(temp_db.load_messages("memory_session")) == 1
+        
+        assert not Path(MEMORY_DB_PATH).exists()
+        assert ChatHistoryDatabase(MEMORY_DB_PATH) is temp_db
     
     def test_create_conversation(self, temp_db):
         """会話作成のテスト"""
@@ -113,6 +125,64 @@ class TestChatHistoryDatabase:
         assert isinstance(restored_image, Image.Image)
         assert restored_image.size == sample_image.size
     
+    def test_save_image_message_is_lossless(self, temp_db):
+        """元ファイルのない画像はPNGで可逆に保存されるテスト"""
+        session_id = "test_session_lossless"
+        image = Image.frombytes('RGB', (16, 16), bytes(range(256)) * 3)
+        
+        temp_db.save_message(session_id, "user", "画像付き", image)
+        
+        restored = temp_db.load_messages(session_id)[0]["image"]
+        assert restored.format == "PNG"
+        assert restored.convert('RGB').tobytes() == image.tobytes()
+    
+    def test_save_image_message_keeps_original_bytes(self, temp_db, sample_image):
+        """元ファイルのバイト列を渡した場合は再エンコードせずにそのまま保存されるテスト"""
+        buffer = io.BytesIO()
+        sample_image.save(buffer, format="JPEG", quality=50)
+        file_bytes = buffer.getvalue()
+        uploaded_image = Image.open(io.BytesIO(file_bytes))
+        
+        message_id = temp_db.save_message("test_session_raw_image", "user", "画像", uploaded_image,
+                                          image_bytes=file_bytes)
+        
+        with temp_db._connection() as conn:
+            stored, image_format = conn.execute(
+                "SELECT image_data, image_format FROM messages WHERE id = ?", (message_id,)
+            ).fetchone()
+        assert stored == file_bytes
+        assert image_format == "JPEG"
+    
+    def test_load_messages_without_images(self, temp_db, sample_image):
+        """画像を読み込まずにメッセージを取得し、画像を個別に取得するテスト"""
+        session_id = "test_session_lazy_image"
+        message_id = temp_db.save_message(session_id, "user", "画像付き", sample_image)
+        
+        messages = temp_db.load_messages(session_id, include_images=False)
+        assert messages[0]["has_image"] is True
+        assert "image" not in messages[0]
+        
+        image = temp_db.get_message_image(messages[0]["id"])
+        assert messages[0]["id"] == message_id
+        assert image.size == sample_image.size
+    
+    def test_load_legacy_base64_image(self, file_db, sample_image):
+        """base64文字列で保存された以前の画像データの読み込みテスト"""
+        session_id = "test_session_legacy_image"
+        file_db.save_message(session_id, "user", "古い形式の画像")
+        
+        buffer = io.BytesIO()
+        sample_image.save(buffer, format="PNG")
+        legacy_data = base64.b64encode(buffer.getvalue()).decode('utf-8')
+        with sqlite3.connect(file_db.db_path) as conn:
+            conn.execute(
+                "UPDATE messages SET has_image = TRUE, image_data = ?, image_format = 'PNG'",
+                (legacy_data,)
+            )
+        
+        messages = file_db.load_messages(session_id)
+        assert messages[0]["image"].size == sample_image.size
+    
     def test_multiple_messages(self, temp_db):
         """複数メッセージのテスト"""
         session_id = "test_session_5"
@@ -128,15 +198,57 @@ class TestChatHistoryDatabase:
         assert messages[0]["role"] == "user"
         assert messages[1]["role"] == "assistant"
         assert messages[2]["role"] == "user"
+        
+        # 会話は1件のみ作成され、タイトルは最初のメッセージのまま
+        conversations = temp_db.get_conversations()
+        assert len(conversations) == 1
+        assert conversations[0]["title"] == "最初のメッセージ"
+        assert conversations[0]["message_count"] == 3
+    
+    def test_save_messages_bulk(self, temp_db, sample_image):
+        """複数メッセージの一括保存テスト"""
+        session_id = "test_session_bulk"
+        
+        count = temp_db.save_messages_bulk(session_id, [
+            {"role": "user", "content": "一括保存の質問", "image": sample_image},
+            {"role": "assistant", "content": "一括保存の応答"},
+        ], model_name="GPT-4o")
+        assert count == 2
+        
+        messages = temp_db.load_messages(session_id)
+        assert [m["role"] for m in messages] == ["user", "assistant"]
+        assert messages[0]["image"].size == sample_image.size
+        assert "image" not in messages[1]
+        
+        conversations = temp_db.get_conversations()
+        assert conversations[0]["title"] == "一括保存の質問"
+        assert conversations[0]["model_name"] == "GPT-4o"
+        
+        # 空のリストでは何も保存しない
+        assert temp_db.save_messages_bulk("test_session_empty", []) == 0
+        assert temp_db.get_conversation_id("test_session_empty") is None
+    
+    def test_save_message_from_other_thread(self, temp_db):
+        """別スレッドからの保存テスト（接続をスレッド間で共有）"""
+        session_id = "test_session_thread"
+        
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            executor.submit(temp_db.save_message, session_id, "user", "別スレッドから保存").result()
+        
+        messages = temp_db.load_messages(session_id)
+        assert len(messages) == 1
+        assert messages[0]["content"] == "別スレッドから保存"
     
     def test_search_messages(self, temp_db):
         """メッセージ検索のテスト"""
         session_id = "test_session_6"
         
         # 検索対象メッセージを作成
-        temp_db.save_message(session_id, "user", "プログラミングについて教えて")
-        temp_db.save_message(session_id, "assistant", "プログラミングは...")
-        temp_db.save_message(session_id, "user", "料理のレシピを知りたい")
+        temp_db.save_messages_bulk(session_id, [
+            {"role": "user", "content": "プログラミングについて教えて"},
+            {"role": "assistant", "content": "プログラミングは..."},
+            {"role": "user", "content": "料理のレシピを知りたい"},
+        ])
         
         # 検索実行
         results = temp_db.search_messages("プログラミング")
@@ -147,14 +259,41 @@ class TestChatHistoryDatabase:
         
         results = temp_db.search_messages("存在しないキーワード")
         assert len(results) == 0
+        
+        # 削除した会話のメッセージは検索結果に含まれない
+        temp_db.delete_conversation(session_id)
+        results = temp_db.search_messages("プログラミング")
+        assert len(results) == 0
+    
+    def test_search_messages_fts_query_is_literal(self, temp_db):
+        """全文検索ではFTS5の演算子や引用符を含むクエリも文字列として検索するテスト"""
+        assert temp_db._fts_enabled
+        session_id = "test_session_fts_literal"
+        
+        temp_db.save_messages_bulk(session_id, [
+            {"role": "user", "content": 'Python AND "Rust" の比較'},
+            {"role": "user", "content": "Python と Rust の比較"},
+        ])
+        
+        # 演算子として解釈されると両方のメッセージに一致してしまう
+        results = temp_db.search_messages("Python AND")
+        assert [r["content"] for r in results] == ['Python AND "Rust" の比較']
+        
+        results = temp_db.search_messages('"Rust"')
+        assert len(results) == 1
+        
+        # 構文として不正なクエリでも例外にならない
+        assert temp_db.search_messages('NEAR(Python') == []
     
     def test_search_messages_sql_injection_protection(self, temp_db):
         """SQLインジェクション攻撃の防止テスト"""
         session_id = "test_session_sql_injection"
         
         # 正常なメッセージを保存
-        temp_db.save_message(session_id, "user", "正常なメッセージです")
-        temp_db.save_message(session_id, "assistant", "こんにちは")
+        temp_db.save_messages_bulk(session_id, [
+            {"role": "user", "content": "正常なメッセージです"},
+            {"role": "assistant", "content": "こんにちは"},
+        ])
         
         # SQLインジェクション攻撃のテストケース
         malicious_queries = [
@@ -176,8 +315,10 @@ class TestChatHistoryDatabase:
         assert len(all_messages) == 2  # 元のメッセージがそのまま残っている
         
         # LIKE句特殊文字のエスケープテスト
-        temp_db.save_message(session_id, "user", "100%完了しました")
-        temp_db.save_message(session_id, "user", "test_value検索")
+        temp_db.save_messages_bulk(session_id, [
+            {"role": "user", "content": "100%完了しました"},
+            {"role": "user", "content": "test_value検索"},
+        ])
         
         # % や _ を含む検索が正しく動作することを確認
         results = temp_db.search_messages("100%")
@@ -205,6 +346,30 @@ class TestChatHistoryDatabase:
         assert "message_count" in conv
         assert "created_at" in conv
         assert "updated_at" in conv
+        
+        # 表示用の更新日時が「月/日 時:分」形式で返されること
+        assert re.fullmatch(r"\d{2}/\d{2} \d{2}:\d{2}", conv["updated_display"])
+    
+    def test_get_conversations_with_cursor(self, temp_db):
+        """カーソルによる会話一覧のページ取得のテスト"""
+        for i in range(5):
+            temp_db.save_message(f"session_{i}", "user", f"会話{i}")
+        
+        first_page = temp_db.get_conversations(limit=2)
+        assert len(first_page) == 2
+        
+        # 前ページ最後の会話を起点に続きを取得
+        last = first_page[-1]
+        second_page = temp_db.get_conversations(limit=2, cursor=(last["updated_at"], last["session_id"]))
+        assert len(second_page) == 2
+        
+        last = second_page[-1]
+        third_page = temp_db.get_conversations(limit=2, cursor=(last["updated_at"], last["session_id"]))
+        assert len(third_page) == 1
+        
+        # ページ間で重複や欠落がないこと
+        session_ids = [conv["session_id"] for conv in first_page + second_page + third_page]
+        assert sorted(session_ids) == [f"session_{i}" for i in range(5)]
     
     def test_delete_conversation(self, temp_db):
         """会話削除のテスト"""
@@ -226,6 +391,9 @@ class TestChatHistoryDatabase:
         assert temp_db.get_conversation_id(session_id) is None
         messages = temp_db.load_messages(session_id)
         assert len(messages) == 0
+        
+        # 外部キー制約によりメッセージも削除される
+        assert temp_db.get_database_info()["message_count"] == 0
     
     def test_clear_all_history(self, temp_db):
         """全履歴削除のテスト"""
@@ -244,12 +412,19 @@ class TestChatHistoryDatabase:
         # 削除後は空
         conversations = temp_db.get_conversations()
         assert len(conversations) == 0
+        assert temp_db.search_messages("メッセージ") == []
+        
+        # 作り直したテーブルに保存でき、全文検索インデックスにも反映される
+        temp_db.save_message("session_3", "user", "削除後のメッセージ")
+        assert len(temp_db.search_messages("削除後の")) == 1
     
     def test_get_database_info(self, temp_db):
         """データベース情報取得のテスト"""
         # いくつかのデータを追加
-        temp_db.save_message("session_1", "user", "テストメッセージ", None)
-        temp_db.save_message("session_1", "assistant", "応答")
+        temp_db.save_messages_bulk("session_1", [
+            {"role": "user", "content": "テストメッセージ"},
+            {"role": "assistant", "content": "応答"},
+        ])
         
         info = temp_db.get_database_info()
         
@@ -268,9 +443,10 @@ class TestChatHistoryDatabase:
         """メッセージ制限のテスト"""
         session_id = "test_session_8"
         
-        # 10個のメッセージを作成
-        for i in range(10):
-            temp_db.save_message(session_id, "user", f"メッセージ {i}")
+        # 10個のメッセージを1つのトランザクションで作成
+        temp_db.save_messages_bulk(session_id, [
+            {"role": "user", "content": f"メッセージ {i}"} for i in range(10)
+        ])
         
         # 制限なしで全て取得
         all_messages = temp_db.load_messages(session_id)
@@ -282,4 +458,77 @@ class TestChatHistoryDatabase:
         
         # 最初の5件が取得されるはず
         for i in range(5):
-            assert limited_messages[i]["content"] == f"メッセージ {i}"
\ No newline at end of file
+            assert limited_messages[i]["content"] == f"メッセージ {i}"
+        
+        # offsetで読み飛ばして取得
+        paged_messages = temp_db.load_messages(session_id, limit=3, offset=5)
+        assert [m["content"] for m in paged_messages] == [f"メッセージ {i}" for i in range(5, 8)]
+        
+        # 最新の3件を時系列順で取得
+        latest_messages = temp_db.load_messages(session_id, limit=3, latest=True)
+        assert [m["content"] for m in latest_messages] == [f"メッセージ {i}" for i in range(7, 10)]
+    
+    def test_iter_messages_streams_in_batches(self, temp_db):
+        """メッセージを1件ずつ取り出せ、途中で書き込みを挟めることのテスト"""
+        session_id = "test_session_iter"
+        temp_db.save_messages_bulk(session_id, [
+            {"role": "user", "content": f"メッセージ {i}"} for i in range(150)
+        ])
+        
+        iterator = temp_db.iter_messages(session_id)
+        assert next(iterator)["content"] == "メッセージ 0"
+        
+        # 読み込みの途中でも別の書き込みがブロックされない
+        temp_db.save_message("other_session", "user", "割り込み")
+        
+        rest = [m["content"] for m in iterator]
+        assert rest == [f"メッセージ {i}" for i in range(1, 150)]
+        
+        latest = [m["content"] for m in temp_db.iter_messages(session_id, limit=2, latest=True)]
+        assert latest == ["メッセージ 148", "メッセージ 149"]
+    
+    def test_iter_messages_ignores_rows_written_while_reading(self, temp_db):
+        """読み込み途中に同じ会話へ書き込んでも、読み込み中の結果に行が増えないテスト"""
+        session_id = "test_session_iter_write"
+        temp_db.save_messages_bulk(session_id, [
+            {"role": "user", "content": f"メッセージ {i}"} for i in range(150)
+        ])
+        
+        iterator = temp_db.iter_messages(session_id)
+        next(iterator)
+        
+        # 別スレッドと同じスレッドの両方から、読み込み中の会話に書き込む
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            executor.submit(temp_db.save_message, session_id, "user", "別スレッドから追加").result()
+        temp_db.save_message(session_id, "user", "同じスレッドから追加")
+        
+        rest = [m["content"] for m in iterator]
+        assert rest == [f"メッセージ {i}" for i in range(1, 150)]
+        assert len(temp_db.load_messages(session_id)) == 152
+    
+    def test_clear_all_history_while_reading(self, temp_db):
+        """読み込み途中でも全履歴を削除でき、削除後の行は返さないテスト"""
+        session_id = "test_session_iter_clear"
+        temp_db.save_messages_bulk(session_id, [
+            {"role": "user", "content": f"メッセージ {i}"} for i in range(150)
+        ])
+        
+        iterator = temp_db.iter_messages(session_id)
+        next(iterator)
+        
+        assert temp_db.clear_all_history() is True
+        
+        # 取得済みのバッチの残りだけが返り、以降のバッチの行は削除済みのため返らない
+        assert len(list(iterator)) == _FETCH_BATCH_SIZE - 1
+    
+    def test_iter_search_messages(self, temp_db):
+        """検索結果を1件ずつ取り出せることのテスト"""
+        temp_db.save_messages_bulk("test_session_iter_search", [
+            {"role": "user", "content": "Pythonの質問です"},
+            {"role": "assistant", "content": "Pythonの回答です"},
+        ])
+        
+        first = next(temp_db.iter_search_messages("Python"))
+        assert first["session_id"] == "test_session_iter_search"
+        assert len(list(temp_db.iter_search_messages("Python", limit=1))) == 1
+        assert list(temp_db.iter_search_messages("")) == []
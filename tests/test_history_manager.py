@@ -3,28 +3,22 @@
 """
 
 import pytest
-import tempfile
-import os
+import json
 from PIL import Image
 
+from src.utils.database import MEMORY_DB_PATH
 from src.utils.history_manager import ChatHistoryManager
 
 @pytest.fixture
-def temp_manager():
-    """テスト用の一時履歴マネージャー"""
-    with tempfile.NamedTemporaryFile(suffix=".db", delete=False) as f:
-        db_path = f.name
-    
-    manager = ChatHistoryManager(db_path)
+def temp_manager(memory_history_db):
+    """テスト用の一時履歴マネージャー（共有のメモリ上のデータベースをテストごとに空にして使い回す）"""
+    manager = ChatHistoryManager(MEMORY_DB_PATH)
     yield manager
-    
-    # クリーンアップ
-    if os.path.exists(db_path):
-        os.unlink(db_path)
+    memory_history_db.clear_all_history()
 
-@pytest.fixture
+@pytest.fixture(scope="module")
 def sample_image():
-    """テスト用のサンプル画像"""
+    """テスト用のサンプル画像（テストでは変更しないためモジュール内で共有）"""
     image = Image.new('RGB', (100, 100), color='blue')
     return image
 
@@ -65,6 +59,19 @@ class TestChatHistoryManager:
         assert messages[0]["role"] == "user"
         assert messages[0]["content"] == content
     
+    def test_save_messages_with_explicit_session(self, temp_manager):
+        """セッションIDを指定したメッセージ保存のテスト"""
+        temp_manager.set_current_session("current_session")
+        
+        # 現在のセッションとは別のセッションに保存
+        temp_manager.save_user_message("質問", session_id="other_session")
+        temp_manager.save_assistant_message("回答", session_id="other_session")
+        
+        assert temp_manager.get_current_session_id() == "current_session"
+        assert temp_manager.load_session_messages("current_session") == []
+        messages = temp_manager.load_session_messages("other_session")
+        assert [msg["role"] for msg in messages] == ["user", "assistant"]
+    
     def test_save_and_load_image_message(self, temp_manager, sample_image):
         """画像付きメッセージの保存・読み込みテスト"""
         content = "この画像について教えて"
@@ -213,7 +220,6 @@ class TestChatHistoryManager:
         assert "テスト応答" in exported_data
         
         # JSONとしてパースできるかチェック
-        import json
         parsed_data = json.loads(exported_data)
         assert isinstance(parsed_data, list)
         assert len(parsed_data) == 2
@@ -246,6 +252,19 @@ class TestChatHistoryManager:
         assert "テストメッセージ" in exported_data
         assert "テスト応答" in exported_data
     
+    def test_export_conversation_with_image(self, temp_manager):
+        """画像付きの会話のエクスポートでは画像の有無のみを出力するテスト"""
+        session_id = temp_manager.start_new_session()
+        temp_manager.save_user_message("画像の質問", image=Image.new('RGB', (10, 10), color='blue'))
+        temp_manager.save_assistant_message("画像の回答")
+        
+        parsed_data = json.loads(temp_manager.export_conversation(session_id, "json"))
+        assert [msg["has_image"] for msg in parsed_data] == [True, False]
+        assert all("image" not in msg for msg in parsed_data)
+        
+        assert temp_manager.export_conversation(session_id, "text").count("(画像あり)") == 1
+        assert temp_manager.export_conversation(session_id, "markdown").count("*📷 画像あり*") == 1
+    
     def test_get_statistics(self, temp_manager):
         """統計情報取得のテスト"""
         # データ作成
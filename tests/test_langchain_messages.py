@@ -0,0 +1,175 @@
+"""
+LangChainメッセージ履歴の管理のテスト
+"""
+import pytest
+from types import SimpleNamespace
+from unittest.mock import Mock
+from langchain_core.messages import AIMessage, HumanMessage
+from src.utils.langchain_messages import (
+    SYSTEM_MESSAGE,
+    apply_history_window,
+    reset_langchain_messages,
+    sync_langchain_messages,
+)
+
+FILE_API_MODEL = "Claude Sonnet 4"
+
+# 履歴の切り詰めのケース（会話履歴, 送信する直近メッセージ数, 送信されるメッセージ本文）
+_CONVERSATION = [
+    HumanMessage(content="質問1"), AIMessage(content="回答1"),
+    HumanMessage(content="質問2"), AIMessage(content="回答2"),
+    HumanMessage(content="質問3"),
+]
+_HISTORY_WINDOW_CASES = [
+    pytest.param(_CONVERSATION, 0, ["質問1", "回答1", "質問2", "回答2", "質問3"], id="window-zero"),
+    pytest.param(_CONVERSATION, -1, ["質問1", "回答1", "質問2", "回答2", "質問3"], id="window-negative"),
+    pytest.param(_CONVERSATION, 5, ["質問1", "回答1", "質問2", "回答2", "質問3"], id="length-equals-window"),
+    pytest.param(_CONVERSATION, 10, ["質問1", "回答1", "質問2", "回答2", "質問3"], id="length-below-window"),
+    pytest.param(_CONVERSATION, 3, ["質問2", "回答2", "質問3"], id="starts-with-human"),
+    pytest.param(_CONVERSATION, 4, ["質問2", "回答2", "質問3"], id="drops-leading-ai"),
+    pytest.param(_CONVERSATION, 2, ["質問3"], id="drops-leading-ai-short"),
+    pytest.param([], 3, [], id="empty-history"),
+]
+
+def _convert(msg, include_image, file_api_model):
+    """アプリの変換処理と同じ形式でメッセージを変換する（アップロード済みの画像はファイルIDで参照）"""
+    if msg["role"] == "assistant":
+        return AIMessage(content=msg["content"])
+    if "image" in msg and include_image:
+        file_id = msg.get("_file_ids", {}).get("anthropic") if file_api_model else None
+        if file_id:
+            image_part = {"type": "image", "file_id": file_id}
+        else:
+            image_part = {"type": "image_url", "image_url": {"url": "data:image/png;base64,AAAA"}}
+        return HumanMessage(content=[{"type": "text", "text": msg["content"]}, image_part])
+    return HumanMessage(content=msg["content"])
+
+def _image_types(message):
+    """メッセージに添付された画像の種類（"image_url"・"image"）の一覧"""
+    if not isinstance(message.content, list):
+        return []
+    return [part["type"] for part in message.content if part["type"] != "text"]
+
+def _image_message(content, **extra):
+    """画像付きのユーザーメッセージ"""
+    return {"role": "user", "content": content, "image": object(), **extra}
+
+@pytest.fixture
+def state():
+    """st.session_state の代わりに使うセッション状態"""
+    session_state = SimpleNamespace(messages=[])
+    reset_langchain_messages(session_state)
+    return session_state
+
+@pytest.fixture
+def convert():
+    """呼び出しを記録する変換処理"""
+    return Mock(side_effect=_convert)
+
+class TestSyncLangchainMessages:
+    """sync_langchain_messages関数のテスト"""
+    
+    def test_converts_only_new_messages(self, state, convert):
+        """変換済みのメッセージは再変換せず、未変換の分だけを順に追記するテスト"""
+        state.messages += [{"role": "user", "content": "質問1"}, {"role": "assistant", "content": "回答1"}]
+        sync_langchain_messages(state, False, None, convert)
+        state.messages.append({"role": "user", "content": "質問2"})
+        
+        result = sync_langchain_messages(state, False, None, convert)
+        
+        assert result is state.langchain_messages
+        assert result[0] is SYSTEM_MESSAGE
+        assert [m.content for m in result[1:]] == ["質問1", "回答1", "質問2"]
+        assert convert.call_count == 3
+    
+    def test_resets_when_format_changes(self, state, convert):
+        """画像対応の有無や送信方法が変わった場合は全メッセージを変換し直すテスト"""
+        state.messages.append(_image_message("画像の質問"))
+        assert _image_types(sync_langchain_messages(state, True, None, convert)[-1]) == ["image_url"]
+        
+        result = sync_langchain_messages(state, False, None, convert)
+        
+        assert [m.content for m in result[1:]] == ["画像の質問"]
+        assert state.langchain_format == (False, None)
+        assert convert.call_count == 2
+    
+    def test_strips_base64_image_from_previous_latest(self, state, convert):
+        """最新でなくなったメッセージのbase64画像を外し、最新のメッセージにのみ添付するテスト"""
+        state.messages.append(_image_message("1枚目"))
+        sync_langchain_messages(state, True, None, convert)
+        state.messages += [{"role": "assistant", "content": "回答"}, _image_message("2枚目")]
+        
+        result = sync_langchain_messages(state, True, None, convert)
+        
+        assert result[1] == HumanMessage(content="1枚目")
+        assert _image_types(result[3]) == ["image_url"]
+    
+    def test_keeps_images_referenced_by_file_id(self, state, convert):
+        """ファイルIDで参照できる過去の画像は残し、アップロードに失敗した画像は外すテスト"""
+        state.messages += [
+            _image_message("アップロード済み", _file_ids={"anthropic": "file_1"}),
+            _image_message("アップロード失敗", _file_ids={"anthropic": None}),
+            {"role": "assistant", "content": "回答"},
+        ]
+        
+        result = sync_langchain_messages(state, True, FILE_API_MODEL, convert)
+        
+        assert _image_types(result[1]) == ["image"]
+        assert _image_types(result[2]) == []
+        
+        # 最新のメッセージとしてbase64で送信した画像も、次のターンでは外す
+        state.messages.append(_image_message("新しい画像", _file_ids={"anthropic": None}))
+        assert _image_types(sync_langchain_messages(state, True, FILE_API_MODEL, convert)[-1]) == ["image_url"]
+        state.messages.append({"role": "assistant", "content": "回答2"})
+        
+        result = sync_langchain_messages(state, True, FILE_API_MODEL, convert)
+        
+        assert result[4] == HumanMessage(content="新しい画像")
+        assert _image_types(result[1]) == ["image"]
+    
+    def test_multi_file_batch_order(self, state, convert):
+        """複数ファイルの質問と応答の組を追加した後も、履歴の順序どおりに変換されるテスト"""
+        state.messages += [{"role": "user", "content": "最初の質問"}, {"role": "assistant", "content": "最初の回答"}]
+        history = sync_langchain_messages(state, True, FILE_API_MODEL, convert)
+        
+        # ファイルごとの質問は直近の履歴を共有して、それぞれ1つのリクエストにする
+        user_messages = [
+            _image_message("ファイル1について", _file_ids={"anthropic": "file_1"}),
+            _image_message("ファイル2について", _file_ids={"anthropic": None}),
+        ]
+        request_batch = [[*history, convert(msg, True, FILE_API_MODEL)] for msg in user_messages]
+        assert [len(request) for request in request_batch] == [4, 4]
+        
+        # 質問と応答の組を順に履歴に追加する
+        for index, user_message in enumerate(user_messages, 1):
+            state.messages += [user_message, {"role": "assistant", "content": f"ファイル{index}の回答"}]
+        
+        result = sync_langchain_messages(state, True, FILE_API_MODEL, convert)
+        
+        assert [m.text for m in result[1:]] == [
+            "最初の質問", "最初の回答",
+            "ファイル1について", "ファイル1の回答",
+            "ファイル2について", "ファイル2の回答",
+        ]
+        assert _image_types(result[3]) == ["image"]
+        assert _image_types(result[5]) == []
+
+class TestApplyHistoryWindow:
+    """apply_history_window関数のテスト"""
+    
+    @pytest.mark.parametrize("history, window, expected", _HISTORY_WINDOW_CASES)
+    def test_apply_history_window(self, history, window, expected):
+        """システムメッセージを残したまま直近の履歴だけを送信するテスト"""
+        langchain_messages = [SYSTEM_MESSAGE, *history]
+        
+        result = apply_history_window(langchain_messages, window)
+        
+        assert result[0] is SYSTEM_MESSAGE
+        assert [m.content for m in result[1:]] == expected
+    
+    def test_returns_same_list_without_truncation(self):
+        """切り詰めが不要な場合は変換済みの履歴をコピーせずにそのまま返すテスト"""
+        langchain_messages = [SYSTEM_MESSAGE, *_CONVERSATION]
+        
+        assert apply_history_window(langchain_messages, 0) is langchain_messages
+        assert apply_history_window(langchain_messages, len(_CONVERSATION)) is langchain_messages
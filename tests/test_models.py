@@ -8,7 +8,40 @@ from src.models import (
     ModelConfig, 
     create_model, 
     get_available_models, 
-    check_model_availability
+    check_model_availability,
+    upload_image_file
+)
+
+# 表示名・APIキーの環境変数・生成されるクラスと、クラスに渡される引数の期待値
+_CREATE_MODEL_CASES = (
+    pytest.param(
+        "GPT-4o", "OPENAI_API_KEY", "langchain_openai.ChatOpenAI",
+        {"model": "gpt-4o", "openai_api_key": "test-api-key", "temperature": 0.7, "max_tokens": 1000},
+        id="openai-gpt-4o",
+    ),
+    pytest.param(
+        "GPT-4.1", "OPENAI_API_KEY", "langchain_openai.ChatOpenAI",
+        {"model": "gpt-4.1", "openai_api_key": "test-api-key", "temperature": 0.7, "max_tokens": 1000},
+        id="openai-gpt-4.1",
+    ),
+    pytest.param(
+        "Claude Sonnet 4", "ANTHROPIC_API_KEY", "langchain_anthropic.ChatAnthropic",
+        {"model": "claude-sonnet-4-20250514", "anthropic_api_key": "test-api-key", "temperature": 0.7,
+         "max_tokens": 1000, "betas": ["files-api-2025-04-14"]},
+        id="anthropic-sonnet-4",
+    ),
+    pytest.param(
+        "Claude Opus 4", "ANTHROPIC_API_KEY", "langchain_anthropic.ChatAnthropic",
+        {"model": "claude-opus-4-20250514", "anthropic_api_key": "test-api-key", "temperature": 0.7,
+         "max_tokens": 1000, "betas": ["files-api-2025-04-14"]},
+        id="anthropic-opus-4",
+    ),
+    pytest.param(
+        "Gemini 2.5 Flash", "GOOGLE_API_KEY", "langchain_google_genai.ChatGoogleGenerativeAI",
+        {"model": "gemini-2.5-flash-preview-05-20", "google_api_key": "test-api-key", "temperature": 0.7,
+         "max_tokens": 1000},
+        id="google-gemini-2.5-flash",
+    ),
 )
 
 
@@ -35,90 +68,17 @@ class TestModelConfig:
 class TestCreateModel:
     """create_model関数のテスト"""
     
-    @patch.dict(os.environ, {"OPENAI_API_KEY": "test-openai-key"})
-    @patch('src.models.factory.ChatOpenAI')
-    def test_create_openai_model(self, mock_openai):
-        """OpenAIモデルの作成テスト"""
-        mock_instance = MagicMock()
-        mock_openai.return_value = mock_instance
-        
-        result = create_model("GPT-4o")
-        
-        assert result == mock_instance
-        mock_openai.assert_called_once_with(
-            model="gpt-4o",
-            openai_api_key="test-openai-key",
-            temperature=0.7,
-            max_tokens=1000
-        )
-    
-    @patch.dict(os.environ, {"OPENAI_API_KEY": "test-openai-key"})
-    @patch('src.models.factory.ChatOpenAI')
-    def test_create_openai_gpt41_model(self, mock_openai):
-        """OpenAI GPT-4.1モデルの作成テスト"""
-        mock_instance = MagicMock()
-        mock_openai.return_value = mock_instance
-        
-        result = create_model("GPT-4.1")
-        
-        assert result == mock_instance
-        mock_openai.assert_called_once_with(
-            model="gpt-4.1",
-            openai_api_key="test-openai-key",
-            temperature=0.7,
-            max_tokens=1000
-        )
-    
-    @patch.dict(os.environ, {"ANTHROPIC_API_KEY": "test-anthropic-key"})
-    @patch('src.models.factory.ChatAnthropic')
-    def test_create_anthropic_sonnet_model(self, mock_anthropic):
-        """Anthropic Claude Sonnet 4モデルの作成テスト"""
-        mock_instance = MagicMock()
-        mock_anthropic.return_value = mock_instance
-        
-        result = create_model("Claude Sonnet 4")
-        
-        assert result == mock_instance
-        mock_anthropic.assert_called_once_with(
-            model="claude-sonnet-4-20250514",
-            anthropic_api_key="test-anthropic-key",
-            temperature=0.7,
-            max_tokens=1000
-        )
-    
-    @patch.dict(os.environ, {"ANTHROPIC_API_KEY": "test-anthropic-key"})
-    @patch('src.models.factory.ChatAnthropic')
-    def test_create_anthropic_opus_model(self, mock_anthropic):
-        """Anthropic Claude Opus 4モデルの作成テスト"""
-        mock_instance = MagicMock()
-        mock_anthropic.return_value = mock_instance
-        
-        result = create_model("Claude Opus 4")
-        
-        assert result == mock_instance
-        mock_anthropic.assert_called_once_with(
-            model="claude-opus-4-20250514",
-            anthropic_api_key="test-anthropic-key",
-            temperature=0.7,
-            max_tokens=1000
-        )
-    
-    @patch.dict(os.environ, {"GOOGLE_API_KEY": "test-google-key"})
-    @patch('src.models.factory.ChatGoogleGenerativeAI')
-    def test_create_google_model(self, mock_google):
-        """Googleモデルの作成テスト"""
-        mock_instance = MagicMock()
-        mock_google.return_value = mock_instance
+    @pytest.mark.parametrize("model_name,api_key_env,model_class,expected_kwargs", _CREATE_MODEL_CASES)
+    def test_create_model(self, monkeypatch, model_name, api_key_env, model_class, expected_kwargs):
+        """各プロバイダーのモデルの作成テスト"""
+        monkeypatch.setenv(api_key_env, "test-api-key")
+        mock_class = MagicMock()
+        monkeypatch.setattr(model_class, mock_class)
         
-        result = create_model("Gemini 2.5 Flash")
+        result = create_model(model_name)
         
-        assert result == mock_instance
-        mock_google.assert_called_once_with(
-            model="gemini-2.5-flash-preview-05-20",
-            google_api_key="test-google-key",
-            temperature=0.7,
-            max_tokens=1000
-        )
+        assert result == mock_class.return_value
+        mock_class.assert_called_once_with(**expected_kwargs)
     
     def test_create_model_invalid_name(self):
         """存在しないモデル名のテスト"""
@@ -132,7 +92,7 @@ class TestCreateModel:
         assert result is None
     
     @patch.dict(os.environ, {"OPENAI_API_KEY": "test-key"})
-    @patch('src.models.factory.ChatOpenAI')
+    @patch('langchain_openai.ChatOpenAI')
     def test_create_model_with_custom_params(self, mock_openai):
         """カスタムパラメータでのモデル作成テスト"""
         mock_instance = MagicMock()
@@ -149,7 +109,7 @@ class TestCreateModel:
         )
     
     @patch.dict(os.environ, {"OPENAI_API_KEY": "test-key"})
-    @patch('src.models.factory.ChatOpenAI')
+    @patch('langchain_openai.ChatOpenAI')
     def test_create_model_exception_handling(self, mock_openai):
         """モデル作成時の例外処理テスト"""
         mock_openai.side_effect = Exception("API Error")
@@ -204,6 +164,15 @@ class TestGetAvailableModels:
         """APIキーが設定されていない場合のテスト"""
         available = get_available_models()
         assert len(available) == 0
+    
+    @patch.dict(os.environ, {"OPENAI_API_KEY": "test-openai-key"})
+    def test_get_available_models_read_only(self):
+        """キャッシュされた結果が変更できないことのテスト"""
+        available = get_available_models()
+        
+        with pytest.raises(TypeError):
+            available["Fake Model"] = {}
+        assert get_available_models() is available
 
 
 class TestCheckModelAvailability:
@@ -227,32 +196,84 @@ class TestCheckModelAvailability:
         assert result is False
 
 
+class TestUploadImageFile:
+    """upload_image_file関数のテスト"""
+    
+    @patch.dict(os.environ, {"ANTHROPIC_API_KEY": "test-anthropic-key"})
+    @patch('anthropic.Anthropic')
+    def test_upload_image_file_anthropic(self, mock_anthropic):
+        """Files API対応モデルでファイルIDが返されるテスト"""
+        mock_client = MagicMock()
+        mock_client.beta.files.upload.return_value = MagicMock(id="file_123")
+        mock_anthropic.return_value = mock_client
+        
+        result = upload_image_file("Claude Sonnet 4", b"image-data", "image.png", "image/png")
+        
+        assert result == "file_123"
+        mock_anthropic.assert_called_once_with(api_key="test-anthropic-key")
+        mock_client.beta.files.upload.assert_called_once_with(
+            file=("image.png", b"image-data", "image/png"),
+            betas=["files-api-2025-04-14"]
+        )
+    
+    @patch.dict(os.environ, {"ANTHROPIC_API_KEY": "test-anthropic-key"})
+    @patch('anthropic.Anthropic')
+    def test_upload_image_file_reuses_client(self, mock_anthropic):
+        """アップロードごとにクライアントを作成せず使い回すテスト"""
+        mock_anthropic.return_value.beta.files.upload.return_value = MagicMock(id="file_123")
+        
+        upload_image_file("Claude Sonnet 4", b"image-1", "image1.png", "image/png")
+        upload_image_file("Claude Opus 4", b"image-2", "image2.png", "image/png")
+        
+        mock_anthropic.assert_called_once_with(api_key="test-anthropic-key")
+        assert mock_anthropic.return_value.beta.files.upload.call_count == 2
+    
+    @patch.dict(os.environ, {"OPENAI_API_KEY": "test-openai-key"})
+    def test_upload_image_file_unsupported_model(self):
+        """Files API非対応モデルではアップロードしないテスト"""
+        result = upload_image_file("GPT-4o", b"image-data", "image.png", "image/png")
+        assert result is None
+    
+    @patch.dict(os.environ, {"ANTHROPIC_API_KEY": "test-anthropic-key"})
+    @patch('anthropic.Anthropic')
+    def test_upload_image_file_error(self, mock_anthropic):
+        """アップロード失敗時にNoneが返されるテスト"""
+        mock_anthropic.return_value.beta.files.upload.side_effect = Exception("Upload failed")
+        
+        result = upload_image_file("Claude Sonnet 4", b"image-data", "image.png", "image/png")
+        
+        assert result is None
+
+
 class TestIntegration:
     """統合テスト"""
     
-    @patch.dict(os.environ, {
-        "OPENAI_API_KEY": "test-openai-key",
-        "ANTHROPIC_API_KEY": "test-anthropic-key",
-        "GOOGLE_API_KEY": "test-google-key"
-    })
-    @patch('src.models.factory.ChatOpenAI')
-    @patch('src.models.factory.ChatAnthropic')
-    @patch('src.models.factory.ChatGoogleGenerativeAI')
-    def test_end_to_end_workflow(self, mock_google, mock_anthropic, mock_openai):
+    def test_end_to_end_workflow(self, monkeypatch):
         """エンドツーエンドのワークフローテスト"""
-        # モックの設定
-        mock_openai.return_value = MagicMock()
-        mock_anthropic.return_value = MagicMock()
-        mock_google.return_value = MagicMock()
+        # プロバイダーごとのAPIキーと生成されるクラス
+        provider_classes = {
+            "openai": ("OPENAI_API_KEY", "langchain_openai.ChatOpenAI"),
+            "anthropic": ("ANTHROPIC_API_KEY", "langchain_anthropic.ChatAnthropic"),
+            "google": ("GOOGLE_API_KEY", "langchain_google_genai.ChatGoogleGenerativeAI"),
+        }
+        mocks = {}
+        for provider, (api_key_env, model_class) in provider_classes.items():
+            monkeypatch.setenv(api_key_env, f"test-{provider}-key")
+            mocks[provider] = MagicMock()
+            monkeypatch.setattr(model_class, mocks[provider])
         
         # 利用可能なモデルを取得
         available = get_available_models()
-        assert len(available) > 0
+        assert len(available) == len(ModelConfig.MODELS)
         
         # 各モデルの作成をテスト
-        for model_name in available.keys():
-            model = create_model(model_name)
-            assert model is not None
+        for model_name in available:
+            assert create_model(model_name) is not None
             
             # 可用性チェック
-            assert check_model_availability(model_name) is True
\ No newline at end of file
+            assert check_model_availability(model_name) is True
+        
+        # 各プロバイダーのクラスがモデル定義の数だけ呼ばれている
+        for provider, mock_class in mocks.items():
+            expected = sum(1 for config in ModelConfig.MODELS.values() if config["provider"] == provider)
+            assert mock_class.call_count == expected
\ No newline at end of file
@@ -0,0 +1,20 @@
+"""
+マルチモーダル対応のテスト
+"""
+import pytest
+from src.models.config import ModelConfig
+
+# モデル名とビジョン対応の期待値
+_VISION_CASES = (
+    ("GPT-4o", True),
+    ("Claude Sonnet 4", True),
+    ("GPT-4.1", False),
+)
+
+class TestMultimodalSupport:
+    """マルチモーダル対応のテスト"""
+    
+    @pytest.mark.parametrize("model,expected", _VISION_CASES)
+    def test_vision_model_configuration(self, model, expected):
+        """ビジョン対応モデルの設定テスト"""
+        assert ModelConfig.MODELS.get(model, {}).get("supports_vision") is expected
@@ -0,0 +1,75 @@
+"""
+画像処理のテスト
+"""
+import pytest
+import io
+from types import SimpleNamespace
+from unittest.mock import Mock
+from PIL import Image
+from src.utils.file_processing import process_image
+
+@pytest.fixture(scope="module")
+def fake_image():
+    """属性を読むだけのテスト用の画像スタブ（800x600のJPEG）"""
+    return SimpleNamespace(size=(800, 600), format="JPEG", mode="RGB")
+
+class TestProcessImage:
+    """画像処理のテスト"""
+    
+    def test_process_image_success(self, monkeypatch, fake_image):
+        """画像処理成功のテスト"""
+        # 属性を読むだけのファイルは軽量なスタブで代用
+        mock_file = SimpleNamespace(name="test.jpg")
+        mock_open = Mock(return_value=fake_image)
+        monkeypatch.setattr('PIL.Image.open', mock_open)
+        
+        result = process_image(mock_file)
+        
+        assert result is not None
+        image, description = result
+        assert image is fake_image
+        assert "test.jpg" in description
+        assert "800 x 600" in description
+        assert "JPEG" in description
+        assert "RGB" in description
+        mock_open.assert_called_once_with(mock_file)
+    
+    def test_process_image_failure(self, monkeypatch):
+        """画像処理失敗のテスト"""
+        mock_file = SimpleNamespace(name="invalid.jpg")
+        mock_open = Mock(side_effect=Exception("Invalid image"))
+        monkeypatch.setattr('PIL.Image.open', mock_open)
+        
+        result = process_image(mock_file)
+        
+        assert result is None
+        mock_open.assert_called_once_with(mock_file)
+    
+    def test_process_image_downscale(self):
+        """最大サイズを超える画像の縮小テスト"""
+        buffer = io.BytesIO()
+        Image.new("RGB", (4000, 3000)).save(buffer, format="JPEG")
+        buffer.seek(0)
+        buffer.name = "large.jpg"
+        
+        image, description = process_image(buffer, max_dimension=2048)
+        
+        assert image.size == (2048, 1536)
+        # 縮小後の画像は元ファイルのフォーマット情報を持たない
+        assert image.format is None
+        assert "4000 x 3000" in description
+        assert "2048 x 1536" in description
+
+class TestEdgeCases:
+    """エッジケースのテスト"""
+    
+    def test_image_with_special_characters_in_filename(self, monkeypatch, fake_image):
+        """特殊文字を含むファイル名の画像処理テスト"""
+        mock_file = SimpleNamespace(name="テスト画像 (1).jpg")
+        monkeypatch.setattr('PIL.Image.open', lambda f: fake_image)
+        
+        result = process_image(mock_file)
+        
+        assert result is not None
+        image, description = result
+        assert "テスト画像 (1).jpg" in description
@@ -0,0 +1,315 @@
+"""
+PDF処理のテスト
+"""
+import pytest
+import io
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import nullcontext
+from types import SimpleNamespace
+from unittest.mock import Mock
+from src.utils.file_processing import (
+    process_pdf,
+    process_pdf_with_pypdf2,
+    process_pdf_with_pdfplumber,
+    process_pdf_with_pypdfium2,
+    _get_pdf_executor,
+)
+
+# PDF抽出のテストは「-m pdf」でまとめて選択できるようにする
+pytestmark = pytest.mark.pdf
+
+@pytest.fixture(scope="module")
+def fake_pdf_pages():
+    """指定したテキストを返すPDFページのスタブを作成する関数"""
+    def build(*texts):
+        return [SimpleNamespace(extract_text=lambda text=text: text) for text in texts]
+    return build
+
+@pytest.fixture(scope="module")
+def fake_pdfplumber_pdf():
+    """with文で開けるpdfplumberのPDFオブジェクトのスタブを作成する関数"""
+    def build(pages):
+        return nullcontext(SimpleNamespace(pages=pages))
+    return build
+
+@pytest.fixture
+def pdf_engines(monkeypatch):
+    """process_pdfが呼び出す各PDFエンジンをモックに差し替える"""
+    engines = SimpleNamespace(pypdfium2=Mock(), pypdf2=Mock(), pdfplumber=Mock())
+    monkeypatch.setattr('src.utils.file_processing.process_pdf_with_pypdfium2', engines.pypdfium2)
+    monkeypatch.setattr('src.utils.file_processing.process_pdf_with_pypdf2', engines.pypdf2)
+    monkeypatch.setattr('src.utils.file_processing.process_pdf_with_pdfplumber', engines.pdfplumber)
+    return engines
+
+
+class TestProcessPdf:
+    """PDF処理のテスト"""
+    
+    def test_process_pdf_pypdfium2_success(self, pdf_engines):
+        """pypdfium2でのPDF処理成功テスト"""
+        mock_file = Mock()
+        pdf_engines.pypdfium2.return_value = "PDF content from pypdfium2"
+        
+        result = process_pdf(mock_file)
+        
+        assert result == "PDF content from pypdfium2"
+        pdf_engines.pypdfium2.assert_called_once_with(mock_file)
+        # 低速なPure Pythonのエンジンは呼ばれない（pypdfium2で成功したため）
+        pdf_engines.pypdf2.assert_not_called()
+        pdf_engines.pdfplumber.assert_not_called()
+    
+    def test_process_pdf_fallback_to_pypdf2(self, pdf_engines):
+        """pypdfium2失敗時のPyPDF2フォールバックテスト"""
+        mock_file = Mock()
+        pdf_engines.pypdfium2.return_value = None
+        pdf_engines.pypdf2.return_value = "PDF content from PyPDF2"
+        
+        result = process_pdf(mock_file)
+        
+        assert result == "PDF content from PyPDF2"
+        pdf_engines.pypdfium2.assert_called_once_with(mock_file)
+        pdf_engines.pypdf2.assert_called_once_with(mock_file)
+        # 最も低速なpdfplumberは呼ばれない（PyPDF2で成功したため）
+        pdf_engines.pdfplumber.assert_not_called()
+    
+    def test_process_pdf_fallback_to_pdfplumber(self, pdf_engines):
+        """pypdfium2・PyPDF2失敗時のpdfplumberフォールバックテスト"""
+        mock_file = Mock()
+        pdf_engines.pypdfium2.return_value = None
+        pdf_engines.pypdf2.return_value = None
+        pdf_engines.pdfplumber.return_value = "PDF content from pdfplumber"
+        
+        result = process_pdf(mock_file)
+        
+        assert result == "PDF content from pdfplumber"
+        pdf_engines.pypdf2.assert_called_once_with(mock_file)
+        pdf_engines.pdfplumber.assert_called_once_with(mock_file)
+    
+    def test_process_pdf_both_fail(self, pdf_engines):
+        """すべての処理が失敗した場合のテスト"""
+        mock_file = Mock()
+        pdf_engines.pypdfium2.return_value = None
+        pdf_engines.pdfplumber.return_value = None
+        pdf_engines.pypdf2.return_value = None
+        
+        result = process_pdf(mock_file)
+        
+        assert result is None
+        pdf_engines.pypdfium2.assert_called_once_with(mock_file)
+        pdf_engines.pdfplumber.assert_called_once_with(mock_file)
+        pdf_engines.pypdf2.assert_called_once_with(mock_file)
+    
+    def test_process_pdf_custom_engine_order(self, pdf_engines, monkeypatch):
+        """設定ファイルでカスタムエンジン順序を指定した場合のテスト"""
+        mock_file = Mock()
+        pdf_engines.pdfplumber.return_value = "pdfplumber result"
+        pdf_engines.pypdf2.return_value = "pypdf2 result"
+        
+        # pdfplumberを先に試すよう設定
+        monkeypatch.setattr(
+            'src.utils.config.get_file_upload_config',
+            lambda: {"pdf_processing": {"engines": ["pdfplumber", "pypdf2"]}},
+        )
+        
+        result = process_pdf(mock_file)
+        
+        assert result == "pdfplumber result"
+        pdf_engines.pdfplumber.assert_called_once_with(mock_file)
+        # PyPDF2は呼ばれない（pdfplumberで成功したため）
+        pdf_engines.pypdf2.assert_not_called()
+        pdf_engines.pypdfium2.assert_not_called()
+    
+    def test_process_pdf_fallback_on_config_error(self, pdf_engines, monkeypatch):
+        """設定読み込みエラー時のフォールバック動作テスト"""
+        mock_file = Mock()
+        pdf_engines.pypdfium2.return_value = "pypdfium2 result"
+        monkeypatch.setattr(
+            'src.utils.config.get_file_upload_config',
+            Mock(side_effect=ImportError("config error")),
+        )
+        
+        result = process_pdf(mock_file)
+        
+        assert result == "pypdfium2 result"
+        pdf_engines.pypdfium2.assert_called_once_with(mock_file)
+        pdf_engines.pypdf2.assert_not_called()
+        pdf_engines.pdfplumber.assert_not_called()
+
+
+def _build_text_pdf(page_texts):
+    """各ページに1行ずつテキストを配置した最小構成のPDFを作成"""
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>"]
+    kids = " ".join(f"{3 + 2 * i} 0 R" for i in range(len(page_texts)))
+    objects.append(f"<< /Type /Pages /Kids [{kids}] /Count {len(page_texts)} >>".encode())
+    font_ref = 3 + 2 * len(page_texts)
+    for i, text in enumerate(page_texts):
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 300 300] /Contents {4 + 2 * i} 0 R "
+            f"/Resources << /Font << /F1 {font_ref} 0 R >> >> >>".encode()
+        )
+        stream = f"BT /F1 12 Tf 20 250 Td ({text}) Tj ET".encode()
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+    objects.append(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    
+    pdf = b"%PDF-1.4\n"
+    offsets = []
+    for number, obj in enumerate(objects, 1):
+        offsets.append(len(pdf))
+        pdf += b"%d 0 obj\n" % number + obj + b"\nendobj\n"
+    xref = len(pdf)
+    pdf += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    pdf += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    pdf += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return pdf
+
+class TestProcessPdfWithPypdfium2:
+    """pypdfium2でのPDF処理テスト"""
+    
+    def test_pypdfium2_success(self):
+        """pypdfium2での処理成功テスト（空のページは出力しない）"""
+        pdf_file = io.BytesIO(_build_text_pdf(["Page one", "", "Page three"]))
+        pdf_file.name = "test.pdf"
+        pdf_file.read()
+        
+        result = process_pdf_with_pypdfium2(pdf_file)
+        
+        assert result == "--- ページ 1 ---\nPage one\n\n--- ページ 3 ---\nPage three"
+    
+    def test_pypdfium2_failure(self):
+        """pypdfium2での処理失敗テスト"""
+        pdf_file = io.BytesIO(b"not a pdf")
+        pdf_file.name = "broken.pdf"
+        
+        assert process_pdf_with_pypdfium2(pdf_file) is None
+
+class TestParallelPdfExtraction:
+    """Pure PythonのPDFエンジンでのページ並列抽出のテスト"""
+    
+    @pytest.mark.parametrize("process", [process_pdf_with_pypdf2, process_pdf_with_pdfplumber])
+    def test_parallel_matches_serial(self, monkeypatch, process):
+        """並列抽出でもページ順と出力形式が逐次処理と同じであることのテスト"""
+        pdf_bytes = _build_text_pdf([f"Page {i}" if i != 3 else "" for i in range(1, 6)])
+        
+        def run():
+            pdf_file = io.BytesIO(pdf_bytes)
+            pdf_file.name = "test.pdf"
+            return process(pdf_file)
+        
+        monkeypatch.setattr('src.utils.file_processing._PDF_WORKERS', 1)
+        serial = run()
+        monkeypatch.setattr('src.utils.file_processing._PDF_WORKERS', 2)
+        parallel = run()
+        
+        assert parallel == serial
+        assert "--- ページ 5 ---\nPage 5" in parallel
+        assert "--- ページ 3 ---" not in parallel
+    
+    def test_parallel_failure_falls_back_to_serial(self, monkeypatch):
+        """並列処理に失敗した場合は逐次処理で抽出することのテスト"""
+        monkeypatch.setattr('src.utils.file_processing._PDF_WORKERS', 2)
+        monkeypatch.setattr(
+            'src.utils.file_processing._get_pdf_executor',
+            Mock(side_effect=OSError("cannot start workers")),
+        )
+        pdf_file = io.BytesIO(_build_text_pdf([f"Page {i}" for i in range(1, 5)]))
+        pdf_file.name = "test.pdf"
+        
+        result = process_pdf_with_pypdf2(pdf_file)
+        
+        assert result.startswith("--- ページ 1 ---\nPage 1")
+        assert "--- ページ 4 ---\nPage 4" in result
+
+    def test_broken_pool_is_recreated(self, monkeypatch):
+        """ワーカーが異常終了した場合はプールを破棄し、逐次処理で抽出することのテスト"""
+        monkeypatch.setattr('src.utils.file_processing._PDF_WORKERS', 2)
+        get_executor = Mock()
+        get_executor.return_value.map.side_effect = BrokenProcessPool("worker died")
+        monkeypatch.setattr('src.utils.file_processing._get_pdf_executor', get_executor)
+        pdf_file = io.BytesIO(_build_text_pdf([f"Page {i}" for i in range(1, 5)]))
+        pdf_file.name = "test.pdf"
+        
+        result = process_pdf_with_pypdf2(pdf_file)
+        
+        assert "--- ページ 4 ---\nPage 4" in result
+        get_executor.cache_clear.assert_called_once()
+    
+    def test_executor_is_shared_and_spawned(self):
+        """プロセスプールは使い回され、spawnでワーカーを起動することのテスト"""
+        executor = _get_pdf_executor()
+        
+        assert _get_pdf_executor() is executor
+        assert executor._mp_context.get_start_method() == "spawn"
+
+class TestProcessPdfWithPyPdf2:
+    """PyPDF2でのPDF処理テスト"""
+    
+    def test_pypdf2_success(self, monkeypatch, fake_pdf_pages):
+        """PyPDF2での処理成功テスト"""
+        mock_file = Mock()
+        
+        reader = SimpleNamespace(pages=fake_pdf_pages("Page 1 content", "Page 2 content"))
+        monkeypatch.setattr('PyPDF2.PdfReader', lambda f: reader)
+        
+        result = process_pdf_with_pypdf2(mock_file)
+        
+        assert result is not None
+        assert "Page 1 content" in result
+        assert "Page 2 content" in result
+        assert "--- ページ 1 ---" in result
+        assert "--- ページ 2 ---" in result
+        # ページ間は空行1つで区切られ、末尾に余分な区切りはない
+        assert result == "--- ページ 1 ---\nPage 1 content\n\n--- ページ 2 ---\nPage 2 content"
+        mock_file.seek.assert_called_once_with(0)
+    
+    def test_pypdf2_failure(self, monkeypatch):
+        """PyPDF2での処理失敗テスト"""
+        mock_file = Mock()
+        monkeypatch.setattr('PyPDF2.PdfReader', Mock(side_effect=Exception("PDF reading error")))
+        
+        result = process_pdf_with_pypdf2(mock_file)
+        
+        assert result is None
+        mock_file.seek.assert_called_once_with(0)
+
+class TestProcessPdfWithPdfplumber:
+    """pdfplumberでのPDF処理テスト"""
+    
+    def test_pdfplumber_success(self, monkeypatch, fake_pdf_pages, fake_pdfplumber_pdf):
+        """pdfplumberでの処理成功テスト"""
+        mock_file = Mock()
+        
+        pages = fake_pdf_pages("Page 1 content", "Page 2 content")
+        monkeypatch.setattr('pdfplumber.open', lambda f: fake_pdfplumber_pdf(pages))
+        
+        result = process_pdf_with_pdfplumber(mock_file)
+        
+        assert result is not None
+        assert "Page 1 content" in result
+        assert "Page 2 content" in result
+        assert "--- ページ 1 ---" in result
+        assert "--- ページ 2 ---" in result
+        mock_file.seek.assert_called_once_with(0)
+    
+    def test_pdfplumber_failure(self, monkeypatch):
+        """pdfplumberでの処理失敗テスト"""
+        mock_file = Mock()
+        monkeypatch.setattr('pdfplumber.open', Mock(side_effect=Exception("PDF reading error")))
+        
+        result = process_pdf_with_pdfplumber(mock_file)
+        
+        assert result is None
+        mock_file.seek.assert_called_once_with(0)
+
+class TestEdgeCases:
+    """エッジケースのテスト"""
+    
+    def test_empty_pdf_pages(self, monkeypatch, fake_pdf_pages, fake_pdfplumber_pdf):
+        """空のPDFページの処理テスト"""
+        mock_file = Mock()
+        
+        # 空のテキストのページのみ
+        pages = fake_pdf_pages("")
+        monkeypatch.setattr('pdfplumber.open', lambda f: fake_pdfplumber_pdf(pages))
+        
+        result = process_pdf_with_pdfplumber(mock_file)
+        assert result is None
@@ -0,0 +1,128 @@
+"""
+ユーザー入力サニタイズのテスト
+"""
+import pytest
+import re
+import bleach
+from unittest.mock import Mock
+from src.utils.file_processing import sanitize_user_input
+
+def _any_of(*substrings):
+    """いずれかの文字列に一致する正規表現（結果を1回の走査で検査するため）"""
+    return re.compile("|".join(map(re.escape, substrings)))
+
+# 長い入力のテストで使う本文（インポート時に一度だけ作成）
+_LONG_TEXT = "A" * 10000
+
+# 危険な入力と、結果に含まれてはならない文字列のパターン・含まれるべき文字列
+_XSS_CASES = (
+    pytest.param(
+        "<script>alert('XSS')</script>",
+        _any_of("<script>", "alert('XSS')"), (),
+        id="script_tag",
+    ),
+    pytest.param(
+        "<img src=x onerror=alert('XSS')>",
+        _any_of("<img", "onerror", "alert('XSS')"), (),
+        id="img_onerror",
+    ),
+    pytest.param(
+        "<b>Bold text</b> <em>Emphasized text</em> <code>Code text</code>",
+        _any_of("&lt;", "&gt;"), ("<b>Bold text</b>", "<em>Emphasized text</em>", "<code>Code text</code>"),
+        id="allowed_tags",
+    ),
+    pytest.param(
+        "<b>Safe bold</b> <script>alert('XSS')</script> <em>Safe emphasis</em>",
+        _any_of("<script>", "alert('XSS')"), ("Safe bold", "Safe emphasis"),
+        id="mixed_content",
+    ),
+    pytest.param(
+        """
+        <div onclick="alert('XSS')">Click me</div>
+        <svg onload="alert('XSS')">
+        <iframe src="javascript:alert('XSS')"></iframe>
+        <a href="javascript:alert('XSS')">Link</a>
+        """,
+        _any_of("onclick", "onload", "javascript:", "alert('XSS')", "<svg", "<iframe"), (),
+        id="complex_xss",
+    ),
+    pytest.param(
+        # 非常に長い文字列でもエラーにならず、危険なコンテンツだけが除去される
+        _LONG_TEXT + "<script>alert('XSS')</script>",
+        _any_of("<script>", "alert('XSS')"), (_LONG_TEXT,),
+        id="long_text",
+    ),
+)
+
+# 入力とサニタイズ後の期待値が完全に決まるケース
+_EXACT_CASES = (
+    pytest.param("", "", id="empty"),
+    pytest.param(None, None, id="none"),
+    # 通常のテキストはそのまま保持
+    pytest.param(
+        "This is normal text without any HTML tags.",
+        "This is normal text without any HTML tags.",
+        id="normal_text",
+    ),
+    # 許可されたタグは保持され、テキストの特殊文字は一度だけエスケープされる
+    pytest.param("<b>Bold</b> <i>it's</i>", "<b>Bold</b> <i>it's</i>", id="allowed_tags_once"),
+    pytest.param("if a < b && c > d:", "if a &lt; b &amp;&amp; c &gt; d:", id="special_chars_once"),
+    # scriptやstyleはタグだけでなく中身も除去される
+    pytest.param(
+        "前<script type='text/javascript'>alert(1)</script><STYLE>p{}</STYLE>後",
+        "前後",
+        id="script_body",
+    ),
+    # JavaScriptプロトコルが除去され、リンク先は実行されない単なる文字列になる
+    pytest.param("[Click me](javascript:alert('XSS'))", "[Click me](alert('XSS'))", id="javascript_protocol"),
+)
+
+
+class TestSanitizeUserInput:
+    """ユーザー入力サニタイズのテスト"""
+    
+    @pytest.mark.parametrize("payload,forbidden,required", _XSS_CASES)
+    def test_sanitize_xss_payload(self, payload, forbidden, required):
+        """危険な要素が除去され、安全な内容は保持されることのテスト"""
+        result = sanitize_user_input(payload)
+        
+        assert result is not None
+        assert forbidden.search(result) is None, result
+        assert all(s in result for s in required), result
+    
+    @pytest.mark.parametrize("payload,expected", _EXACT_CASES)
+    def test_sanitize_exact_output(self, payload, expected):
+        """サニタイズ結果が期待値と完全に一致することのテスト"""
+        assert sanitize_user_input(payload) == expected
+    
+    def test_sanitize_bleach_exception(self, monkeypatch):
+        """bleach処理でエラーが発生した場合のフォールバックテスト"""
+        monkeypatch.setattr(bleach.sanitizer.Cleaner, 'clean', Mock(side_effect=Exception("Bleach error")))
+        
+        input_text = "<script>alert('XSS')</script>"
+        result = sanitize_user_input(input_text)
+        
+        # エラーが発生してもHTMLエスケープは実行される
+        assert result is not None
+        assert "&lt;script&gt;" in result
+        assert "alert(&#x27;XSS&#x27;)" in result  # エスケープされた状態で含まれる
+    
+    def test_sanitize_result_is_cached(self, monkeypatch):
+        """同じ入力のサニタイズ結果はキャッシュされ、長大な入力はキャッシュしないことのテスト"""
+        cleaned = []
+        original_clean = bleach.sanitizer.Cleaner.clean
+        
+        def counting_clean(self, text):
+            cleaned.append(text)
+            return original_clean(self, text)
+        
+        monkeypatch.setattr(bleach.sanitizer.Cleaner, 'clean', counting_clean)
+        
+        input_text = "<b>同じメッセージ</b>"
+        assert sanitize_user_input(input_text) == sanitize_user_input(input_text)
+        assert len(cleaned) == 1
+        
+        long_text = "A" * (16 * 1024 + 1)
+        sanitize_user_input(long_text)
+        sanitize_user_input(long_text)
+        assert len(cleaned) == 3